@@ -1,33 +1,239 @@
 import cv2
+import io
 import os
+import tarfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-def extract_frames(video_path, output_dir):
+# Cap on in-flight async frame writes (double buffering: decode continues
+# while earlier JPEGs are still being encoded/flushed to disk)
+_MAX_PENDING_WRITES = 16
+
+# PyAV (FFmpeg bindings) decodes noticeably faster than cv2.VideoCapture:
+# fewer Python round-trips per frame and multithreaded decode. Optional.
+try:
+    import av
+except ImportError:
+    av = None
+
+# libjpeg-turbo (PyTurboJPEG binding) encodes BGR buffers 2-4x faster than
+# OpenCV's default libjpeg path thanks to SIMD DCT/Huffman. Optional.
+# Module-global so the loaded .so is reused across calls.
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+    _tj = TurboJPEG()
+except Exception:
+    _tj = None
+
+def _encode_jpeg(frame, quality=80):
+    # Encode one BGR frame to JPEG bytes. Quality 80 with optimized
+    # Huffman tables and reduced chroma quality is visually fine for CNN
+    # input and cuts files by roughly 40% vs the library defaults.
+    if _tj is not None:
+        return _tj.encode(frame, quality=quality, pixel_format=TJPF_BGR)
+    ok, buf = cv2.imencode('.jpg', frame,
+                           [int(cv2.IMWRITE_JPEG_QUALITY), quality,
+                            int(cv2.IMWRITE_JPEG_OPTIMIZE), 1,
+                            int(cv2.IMWRITE_JPEG_CHROMA_QUALITY), 70])
+    return buf.tobytes() if ok else None
+
+def _write_jpeg(frame_path, frame, quality=80):
+    # Encode and write one BGR frame as JPEG. Raw os.open/write/close is
+    # the bare three syscalls per frame (no buffered-IO layer), and
+    # O_NOATIME skips the access-time metadata update where supported.
+    data = _encode_jpeg(frame, quality)
+    if data is not None:
+        fd = os.open(frame_path,
+                     os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+                     | getattr(os, 'O_NOATIME', 0), 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+def _add_to_tar(tar, name, data):
+    # Append one JPEG to an open tar stream (single sequential write,
+    # no per-frame open/close syscalls or inode churn)
+    ti = tarfile.TarInfo(name)
+    ti.size = len(data)
+    tar.addfile(ti, io.BytesIO(data))
+
+def _extract_frames_av(video_path, output_dir, target_fps=None, pack=False,
+                       jpeg_quality=80):
+    # Decode with PyAV/FFmpeg, writing JPEGs via cv2.imencode
+    tar = None
+    if pack:
+        tar = tarfile.open(output_dir + '.tar', 'w')
+    else:
+        os.makedirs(output_dir, exist_ok=True)
+    frame_count = 0
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=4) as pool, av.open(video_path) as container:
+        stream = container.streams.video[0]
+        stream.thread_type = 'AUTO'  # Enable FFmpeg multithreaded decode
+
+        stride = 1
+        if target_fps and stream.average_rate:
+            stride = max(1, round(float(stream.average_rate) / target_fps))
+
+        for i, frame in enumerate(container.decode(stream)):
+            if i % stride != 0:
+                continue
+            img = frame.to_ndarray(format='bgr24')
+            frame_name = f"frame_{frame_count:04d}.jpg"
+            if tar is not None:
+                data = _encode_jpeg(img, jpeg_quality)
+                if data is not None:
+                    _add_to_tar(tar, frame_name, data)
+            else:
+                # Offload encode+write so decode and disk I/O overlap
+                pending.append(pool.submit(
+                    _write_jpeg, os.path.join(output_dir, frame_name), img,
+                    jpeg_quality))
+                if len(pending) > _MAX_PENDING_WRITES:
+                    pending.popleft().result()
+            frame_count += 1
+        while pending:
+            pending.popleft().result()
+    if tar is not None:
+        tar.close()
+
+def _done_sentinel(output_dir, pack=False):
+    # Marker file written once extraction finished cleanly
+    return (output_dir + '.done') if pack else os.path.join(output_dir, '.done')
+
+def _mark_done(output_dir, pack=False):
+    with open(_done_sentinel(output_dir, pack), 'w'):
+        pass
+
+def extract_frames(video_path, output_dir, target_fps=None, pack=False,
+                   target_width=None, jpeg_quality=80):
+    # Skip videos that were fully extracted on a previous run so reruns
+    # cost a stat call instead of a full decode+write pass
+    if os.path.exists(_done_sentinel(output_dir, pack)):
+        return
+
+    # Prefer the PyAV/FFmpeg decoder when the binding is installed.
+    # With pack=True, frames go into a single <output_dir>.tar instead of
+    # one JPEG file per frame (far fewer syscalls, sequential writes).
+    if av is not None:
+        _extract_frames_av(video_path, output_dir, target_fps=target_fps,
+                           pack=pack, jpeg_quality=jpeg_quality)
+        _mark_done(output_dir, pack)
+        return
+
+    # Fallback: OpenCV VideoCapture
     # Open the video file
     cap = cv2.VideoCapture(video_path)
-    # Create output directory if it doesn’t exist
-    os.makedirs(output_dir, exist_ok=True)
+    # Tell the kernel the video will be read front to back so it issues
+    # larger, earlier readaheads; the advice fd stays open for the life
+    # of the capture so it keeps applying to the inode
+    advice_fd = None
+    if hasattr(os, 'posix_fadvise'):
+        advice_fd = os.open(video_path, os.O_RDONLY)
+        os.posix_fadvise(advice_fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        os.posix_fadvise(advice_fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    # Shrink the internal capture buffer from the default 4 frames; benign
+    # for files, but cuts RAM and stale-frame latency on any stream input
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    if target_width:
+        # Ask the backend to decode at the lowest useful resolution
+        # (honored by backends that support scaled decode)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, target_width)
+    tar = None
+    if pack:
+        tar = tarfile.open(output_dir + '.tar', 'w')
+    else:
+        # Create output directory if it doesn’t exist
+        os.makedirs(output_dir, exist_ok=True)
     frame_count = 0
-    
-    # Read frames until the video ends
-    while True:
-        ret, frame = cap.read()
-        if not ret:  # Break when no more frames are available
-            break
-        # Save each frame as a JPEG file
-        frame_path = os.path.join(output_dir, f"frame_{frame_count:04d}.jpg")
-        cv2.imwrite(frame_path, frame)
-        frame_count += 1
-    
+
+    # Work out how many source frames to skip between saved frames.
+    # Decoding happens only on retrieve(), so grabbing (and discarding)
+    # the in-between frames is much cheaper than cap.read() on every one.
+    stride = 1
+    if target_fps:
+        src_fps = cap.get(cv2.CAP_PROP_FPS)
+        if src_fps and src_fps > 0:
+            stride = max(1, round(src_fps / target_fps))
+
+    # Grab frames until the video ends, decoding only every stride-th one
+    grab_idx = 0
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        while True:
+            if not cap.grab():  # Break when no more frames are available
+                break
+            if grab_idx % stride == 0:
+                ret, frame = cap.retrieve()
+                if ret:
+                    # Save the decoded frame as a JPEG file
+                    frame_name = f"frame_{frame_count:04d}.jpg"
+                    if tar is not None:
+                        data = _encode_jpeg(frame, jpeg_quality)
+                        if data is not None:
+                            _add_to_tar(tar, frame_name, data)
+                    else:
+                        # Offload encode+write so decode and disk I/O
+                        # overlap; copy because OpenCV reuses the buffer
+                        pending.append(pool.submit(
+                            _write_jpeg,
+                            os.path.join(output_dir, frame_name),
+                            frame.copy(), jpeg_quality))
+                        if len(pending) > _MAX_PENDING_WRITES:
+                            pending.popleft().result()
+                    frame_count += 1
+            grab_idx += 1
+        while pending:
+            pending.popleft().result()
+
     # Release the video capture object
     cap.release()
+    if advice_fd is not None:
+        os.close(advice_fd)
+    if tar is not None:
+        tar.close()
+    _mark_done(output_dir, pack)
+
+def build_previews(video_dir, size=(640, 480), quality=80):
+    # Write display-sized previews into <video_dir>/preview once, so the
+    # labeling UI loads those instead of decoding and downscaling the
+    # full-resolution frame on every keypress
+    preview_dir = os.path.join(video_dir, 'preview')
+    os.makedirs(preview_dir, exist_ok=True)
+    for entry in os.scandir(video_dir):
+        if not entry.name.endswith('.jpg'):
+            continue
+        out_path = os.path.join(preview_dir, entry.name)
+        if os.path.exists(out_path):
+            continue
+        frame = cv2.imread(entry.path)
+        if frame is not None:
+            small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            _write_jpeg(out_path, small, quality=quality)
 
 # Set directories
 VIDEO_DIR = "Videos/Tests"  # Replace with your video folder path
 FRAMES_DIR = "Frames/Tests"      # Replace with where you want frames saved
 
-# Process all MP4 videos
-for video_file in os.listdir(VIDEO_DIR):
-    if video_file.endswith('.mp4'):
-        video_path = os.path.join(VIDEO_DIR, video_file)
-        output_dir = os.path.join(FRAMES_DIR, video_file.replace('.mp4', ''))
-        extract_frames(video_path, output_dir)
+def _extract_one(paths):
+    # Worker entry point: one video per task
+    video_path, output_dir = paths
+    # Keep OpenCV single-threaded in workers so FFmpeg threads don't
+    # multiply by the process count and oversubscribe the cores
+    cv2.setNumThreads(1)
+    extract_frames(video_path, output_dir)
+
+# Process all MP4 videos (one process per video; decoding is CPU-bound)
+if __name__ == "__main__":
+    from concurrent.futures import ProcessPoolExecutor
+
+    pairs = []
+    for video_file in os.listdir(VIDEO_DIR):
+        if video_file.endswith('.mp4'):
+            video_path = os.path.join(VIDEO_DIR, video_file)
+            output_dir = os.path.join(FRAMES_DIR, video_file.replace('.mp4', ''))
+            pairs.append((video_path, output_dir))
+
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+        list(pool.map(_extract_one, pairs))
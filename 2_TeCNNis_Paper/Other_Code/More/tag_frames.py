@@ -11,10 +11,16 @@ class LabelTool:
         self.hit_frames = {}  # Store video name and hit frame
         self.output_csv = output_csv  # CSV filename
         self.output_dir = output_dir  # Directory to save CSV
-        
+        self._dir_cache = {}  # Sorted JPEG listing per directory
+
         # Set up the canvas to display frames
         self.canvas = tk.Canvas(root, width=640, height=480)
         self.canvas.pack()
+
+        # One reusable PhotoImage buffer and canvas item, updated in place
+        # via paste() so each keystroke doesn't allocate a new Tk photo
+        self.img_tk = ImageTk.PhotoImage(Image.new('RGB', (640, 480)))
+        self.canvas_item = self.canvas.create_image(0, 0, anchor=tk.NW, image=self.img_tk)
         
         # Bind keyboard shortcuts
         self.root.bind('<Left>', self.prev_frame)    # Previous frame
@@ -27,21 +33,42 @@ class LabelTool:
         # Load the first video’s frames after canvas is initialized
         self.load_video()
         
+    def _jpegs(self, directory):
+        # Sorted JPEG paths for a directory, memoized across visits
+        # (scandir avoids an extra stat per entry compared to listdir)
+        frames = self._dir_cache.get(directory)
+        if frames is None:
+            frames = sorted(e.path for e in os.scandir(directory)
+                            if e.name.endswith('.jpg'))
+            self._dir_cache[directory] = frames
+        return frames
+
     def load_video(self):
         # Load frames from the current video’s folder
         self.current_video = self.video_dirs[self.current_video_idx]
-        self.frames = [os.path.join(self.current_video, f) for f in os.listdir(self.current_video) if f.endswith('.jpg')]
-        self.frames.sort()  # Sort frames by name (e.g., frame_0001.jpg)
+        self.frames = self._jpegs(self.current_video)  # Sorted by name (e.g., frame_0001.jpg)
+        # Display from pre-generated 640x480 previews when available
+        # (the CSV still records the full-resolution paths)
+        preview_dir = os.path.join(self.current_video, 'preview')
+        self.display_frames = self.frames
+        if os.path.isdir(preview_dir):
+            previews = self._jpegs(preview_dir)
+            if len(previews) == len(self.frames):
+                self.display_frames = previews
         self.current_frame_idx = 0
         self.show_frame()
 
     def show_frame(self):
         # Display the current frame
-        frame_path = self.frames[self.current_frame_idx]
+        frame_path = self.display_frames[self.current_frame_idx]
+        # draft() gets libjpeg to decode at reduced scale (1/2..1/8),
+        # skipping most of the IDCT work for large source frames
         img = Image.open(frame_path)
-        img = img.resize((640, 480), Image.LANCZOS)  # Resize for display
-        self.img_tk = ImageTk.PhotoImage(img)
-        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.img_tk)
+        img.draft('RGB', (640, 480))
+        if img.size != (640, 480):
+            img = img.resize((640, 480), Image.LANCZOS)
+        img = img.convert('RGB')
+        self.img_tk.paste(img)  # Update the existing photo buffer in place
 
     def prev_frame(self, event):
         # Go to the previous frame
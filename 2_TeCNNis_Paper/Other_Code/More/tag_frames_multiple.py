@@ -1,10 +1,40 @@
 import tkinter as tk
+import cv2
+import numpy as np
 from PIL import Image, ImageTk
 import os
 import csv
+import collections
+import queue
+import threading
 from pathlib import Path
 
+def suggest_hits(frames, k=8):
+    """Rank frames by inter-frame motion to suggest likely hit frames.
+
+    Loads tiny greyscale thumbnails, takes the mean absolute luminance
+    difference between consecutive frames, and returns the indices of the
+    k biggest spikes in frame order.
+    """
+    if len(frames) < 2:
+        return []
+    thumbs = []
+    for p in frames:
+        grey = cv2.imread(p, cv2.IMREAD_GRAYSCALE)
+        if grey is None:
+            return []
+        thumbs.append(cv2.resize(grey, (160, 90), interpolation=cv2.INTER_AREA))
+    arr = np.stack(thumbs).astype(np.int16)
+    diff = np.abs(np.diff(arr, axis=0)).mean(axis=(1, 2))
+    k = min(k, len(diff))
+    top = np.argpartition(diff, -k)[-k:]
+    # diff[i] measures motion into frame i+1
+    return sorted(int(i) + 1 for i in top)
+
 class LabelTool:
+    CACHE_SIZE = 32     # Max decoded frames kept in the LRU cache
+    PREFETCH_AHEAD = 8  # Frames decoded ahead of the current position
+
     def __init__(self, root, frames_dir_list, output_csv, output_dir):
         self.root = root
         self.frames_dir_list = frames_dir_list  # List of frame directories
@@ -14,13 +44,41 @@ class LabelTool:
         self.hit_frames = {}
         self.output_csv = output_csv
         self.output_dir = output_dir
-        self.selected_frames = set()  # Track selected frames for current video
+        self.selected_frames = set()  # Selected frame indices for current video
         
         # Load existing CSV data
         self.existing_videos = self.load_existing_csv()
+
+        # Sorted JPEG listing per directory, filled lazily by _jpegs()
+        self._dir_cache = {}
+
+        # Keep the CSV open in append mode and persist each video as soon
+        # as it's finished: bounded I/O per video, nothing lost on a crash
+        os.makedirs(self.output_dir, exist_ok=True)
+        csv_path = os.path.join(self.output_dir, self.output_csv)
+        file_exists = Path(csv_path).is_file()
+        self.csv_fp = open(csv_path, 'a' if file_exists else 'w', newline='')
+        self.csv_writer = csv.writer(self.csv_fp)
+        if not file_exists:
+            self.csv_writer.writerow(["video_name", "frame_path", "is_hit_frame"])
+            self.csv_fp.flush()
+
+        # Decoded-frame LRU cache + background prefetcher. Navigation is
+        # near-sequential, so decoding upcoming frames ahead of time makes
+        # arrow-key scrubbing feel instant.
+        self.cache = collections.OrderedDict()  # frame_path -> PIL Image
+        self.cache_lock = threading.Lock()
+        self.prefetch_q = queue.Queue()
+        threading.Thread(target=self._prefetch_worker, daemon=True).start()
         
         self.canvas = tk.Canvas(root, width=640, height=480)
         self.canvas.pack()
+
+        # One reusable PhotoImage buffer and canvas item, updated in place
+        # via paste() so scrubbing doesn't allocate a new Tk photo (and
+        # accumulate canvas items) on every keystroke
+        self.img_tk = ImageTk.PhotoImage(Image.new('RGB', (640, 480)))
+        self.canvas_item = self.canvas.create_image(0, 0, anchor=tk.NW, image=self.img_tk)
         
         # Status label
         self.status_label = tk.Label(root, text="No frames selected")
@@ -31,86 +89,188 @@ class LabelTool:
         self.root.bind('<Right>', self.next_frame)
         self.root.bind('<space>', self.toggle_frame_selection)
         self.root.bind('<Return>', self.finish_current_video)  # Enter key to move to next video
+        self.root.bind('<s>', self.next_suggestion)  # Jump between motion-spike candidates
         
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         
         # Load video directories from the current frames directory
         self.load_current_dir_videos()
         
+    def _done_sidecar_path(self):
+        return os.path.join(self.output_dir, 'hit_frames.done')
+
     def load_existing_csv(self):
+        # The CSV holds one row per frame, so rescanning it at startup is
+        # O(total frames). Prefer the sidecar that lists one processed
+        # video name per line; it is seeded (or topped up) from a CSV scan
+        # whenever the CSV might hold names the sidecar doesn't — i.e. when
+        # the sidecar is missing, or the CSV was written after it (sessions
+        # labeled before the sidecar existed). Normal labeling appends the
+        # CSV rows then the sidecar line, so the sidecar stays newer and
+        # the fast path holds.
+        done_path = self._done_sidecar_path()
         csv_path = os.path.join(self.output_dir, self.output_csv)
-        existing_videos = set()
+        done_videos = set()
+        if os.path.exists(done_path):
+            with open(done_path, 'r') as f:
+                done_videos = set(f.read().splitlines())
+            if (not os.path.exists(csv_path)
+                    or os.path.getmtime(csv_path) <= os.path.getmtime(done_path)):
+                return done_videos
+
+        csv_videos = set()
         if os.path.exists(csv_path):
             with open(csv_path, 'r') as f:
                 reader = csv.DictReader(f)
                 for row in reader:
-                    existing_videos.add(row['video_name'])
-        return existing_videos
+                    csv_videos.add(row['video_name'])
+        missing = csv_videos - done_videos
+        if missing:
+            with open(done_path, 'a') as f:
+                f.writelines(name + '\n' for name in sorted(missing))
+        return done_videos | csv_videos
 
     def load_current_dir_videos(self):
         """Load video directories from the current frames directory"""
         current_frames_dir = self.frames_dir_list[self.current_dir_idx]
-        self.video_dirs = [os.path.join(current_frames_dir, d) for d in os.listdir(current_frames_dir) 
-                         if os.path.isdir(os.path.join(current_frames_dir, d))]
-        
-        # Reset video index and skip processed videos
+        # Keep only the unprocessed videos up front (one scandir pass)
+        # rather than skipping processed ones with a scan loop on every
+        # video change
+        self.video_dirs = sorted(e.path for e in os.scandir(current_frames_dir)
+                                 if e.is_dir() and e.name not in self.existing_videos)
         self.current_video_idx = 0
-        while (self.current_video_idx < len(self.video_dirs) and 
-               os.path.basename(self.video_dirs[self.current_video_idx]) in self.existing_videos):
-            self.current_video_idx += 1
-            
+
         if self.current_video_idx < len(self.video_dirs):
             self.load_video()
         else:
             self.move_to_next_dir()
 
+    def _jpegs(self, directory):
+        """Sorted JPEG paths for a directory, memoized across visits."""
+        frames = self._dir_cache.get(directory)
+        if frames is None:
+            # scandir avoids the extra stat-per-entry that listdir+isfile costs
+            frames = sorted(e.path for e in os.scandir(directory)
+                            if e.name.endswith('.jpg'))
+            self._dir_cache[directory] = frames
+        return frames
+
     def load_video(self):
         self.current_video = self.video_dirs[self.current_video_idx]
-        self.frames = [os.path.join(self.current_video, f) for f in os.listdir(self.current_video) if f.endswith('.jpg')]
-        self.frames.sort()
+        self.frames = self._jpegs(self.current_video)
+        # Display from the pre-generated 640x480 previews when
+        # extract_frames.build_previews has run (CSV rows still record
+        # the full-resolution paths)
+        preview_dir = os.path.join(self.current_video, 'preview')
+        self.display_frames = self.frames
+        if os.path.isdir(preview_dir):
+            previews = self._jpegs(preview_dir)
+            if len(previews) == len(self.frames):
+                self.display_frames = previews
         self.current_frame_idx = 0
         self.selected_frames = set()  # Reset selected frames for new video
+        self.suggestions = None  # Motion candidates, computed on first 's'
         self.update_status_label()
         self.show_frame()
+        self._queue_prefetch()
 
-    def show_frame(self):
-        frame_path = self.frames[self.current_frame_idx]
+    def _load_display_image(self, frame_path):
+        """Decode and resize one frame to the 640x480 display size."""
+        # draft() asks libjpeg for a reduced-scale (1/2..1/8) decode, so
+        # most of the IDCT work is skipped for large source frames and
+        # LANCZOS only covers the last fractional step down to 640x480
         img = Image.open(frame_path)
-        img = img.resize((640, 480), Image.LANCZOS)
-        
-        # Add visual indicator if frame is selected
-        if frame_path in self.selected_frames:
+        img.draft('RGB', (640, 480))
+        if img.size != (640, 480):
+            img = img.resize((640, 480), Image.LANCZOS)
+        return img.convert('RGB')
+
+    def _cache_get(self, frame_path):
+        with self.cache_lock:
+            img = self.cache.get(frame_path)
+            if img is not None:
+                self.cache.move_to_end(frame_path)
+            return img
+
+    def _cache_put(self, frame_path, img):
+        with self.cache_lock:
+            self.cache[frame_path] = img
+            self.cache.move_to_end(frame_path)
+            while len(self.cache) > self.CACHE_SIZE:
+                self.cache.popitem(last=False)  # Evict least-recently-used
+
+    def _prefetch_worker(self):
+        # Daemon thread: decode queued frames into the cache
+        while True:
+            frame_path = self.prefetch_q.get()
+            try:
+                if self._cache_get(frame_path) is None and os.path.exists(frame_path):
+                    self._cache_put(frame_path, self._load_display_image(frame_path))
+            except Exception:
+                pass  # Best-effort; show_frame decodes on a cache miss
+
+    def _queue_prefetch(self):
+        # Ask the worker to decode the next few frames ahead of the cursor
+        end = min(self.current_frame_idx + 1 + self.PREFETCH_AHEAD, len(self.frames))
+        for i in range(self.current_frame_idx + 1, end):
+            self.prefetch_q.put(self.display_frames[i])
+
+    def show_frame(self):
+        display_path = self.display_frames[self.current_frame_idx]
+        img = self._cache_get(display_path)
+        if img is None:
+            img = self._load_display_image(display_path)
+            self._cache_put(display_path, img)
+
+        # Update the existing photo buffer in place
+        self.img_tk.paste(img)
+
+        # Redraw overlays (selection border + frame counter) without
+        # letting stale items pile up on the canvas
+        self.canvas.delete('overlay')
+        if self.current_frame_idx in self.selected_frames:
             # Draw a green border around selected frames
-            img_draw = ImageTk.PhotoImage(img)
-            self.img_tk = img_draw
-            self.canvas.create_image(0, 0, anchor=tk.NW, image=self.img_tk)
-            self.canvas.create_rectangle(0, 0, 640, 480, outline='green', width=5)
-        else:
-            self.img_tk = ImageTk.PhotoImage(img)
-            self.canvas.create_image(0, 0, anchor=tk.NW, image=self.img_tk)
-            
+            self.canvas.create_rectangle(0, 0, 640, 480, outline='green', width=5,
+                                         tags='overlay')
+
         # Display frame number
         frame_info = f"Frame {self.current_frame_idx + 1}/{len(self.frames)}"
-        self.canvas.create_text(320, 20, text=frame_info, fill="white", font=("Arial", 14))
+        self.canvas.create_text(320, 20, text=frame_info, fill="white",
+                                font=("Arial", 14), tags='overlay')
 
     def prev_frame(self, event):
         if self.current_frame_idx > 0:
             self.current_frame_idx -= 1
             self.show_frame()
+            self._queue_prefetch()
 
     def next_frame(self, event):
         if self.current_frame_idx < len(self.frames) - 1:
             self.current_frame_idx += 1
             self.show_frame()
+            self._queue_prefetch()
+
+    def next_suggestion(self, event):
+        # Cycle through the motion-spike candidates instead of scrubbing
+        # every frame; the ranking is computed once per video on demand
+        if self.suggestions is None:
+            self.suggestions = suggest_hits(self.display_frames)
+        if not self.suggestions:
+            return
+        upcoming = [i for i in self.suggestions if i > self.current_frame_idx]
+        self.current_frame_idx = upcoming[0] if upcoming else self.suggestions[0]
+        self.show_frame()
+        self._queue_prefetch()
 
     def toggle_frame_selection(self, event):
-        current_frame = self.frames[self.current_frame_idx]
-        
-        if current_frame in self.selected_frames:
-            self.selected_frames.remove(current_frame)
+        # Track selections as indices into self.frames: cheaper hashing
+        # and membership tests than full path strings
+        if self.current_frame_idx in self.selected_frames:
+            self.selected_frames.remove(self.current_frame_idx)
         else:
-            self.selected_frames.add(current_frame)
-            
+            self.selected_frames.add(self.current_frame_idx)
+
+
         self.update_status_label()
         self.show_frame()  # Refresh to show selection status
 
@@ -125,17 +285,21 @@ class LabelTool:
                 return
         
         video_name = os.path.basename(self.current_video)
-        self.hit_frames[video_name] = list(self.selected_frames)
-        
-        print(f"Selected {len(self.selected_frames)} frames for {video_name}:")
-        for frame in self.selected_frames:
+        # Materialize the selected indices into paths only at save time
+        selected_paths = [self.frames[i] for i in sorted(self.selected_frames)]
+        self.hit_frames[video_name] = selected_paths
+
+        print(f"Selected {len(selected_paths)} frames for {video_name}:")
+        for frame in selected_paths:
             print(f" - {frame}")
-        
+
+        # Persist this video's rows immediately
+        self.save_video_rows(video_name, selected_paths)
+        self.existing_videos.add(video_name)
+        with open(self._done_sidecar_path(), 'a') as f:
+            f.write(video_name + '\n')
+
         self.current_video_idx += 1
-        while (self.current_video_idx < len(self.video_dirs) and 
-               os.path.basename(self.video_dirs[self.current_video_idx]) in self.existing_videos):
-            self.current_video_idx += 1
-            
         if self.current_video_idx < len(self.video_dirs):
             self.load_video()
         else:
@@ -149,41 +313,35 @@ class LabelTool:
             self.load_current_dir_videos()
         else:
             print("All directories processed!")
-            self.save_csv()
+            self.csv_fp.close()
             self.root.quit()
 
-    def save_csv(self):
-        os.makedirs(self.output_dir, exist_ok=True)
-        csv_path = os.path.join(self.output_dir, self.output_csv)
-        file_exists = Path(csv_path).is_file()
-        
-        with open(csv_path, 'a' if file_exists else 'w', newline='') as f:
-            writer = csv.writer(f)
-            if not file_exists:
-                writer.writerow(["video_name", "frame_path", "is_hit_frame"])
-            
-            for video_name, frame_paths in self.hit_frames.items():
-                if video_name in self.existing_videos:
-                    continue
-                    
-                video_dir = os.path.dirname(frame_paths[0]) if frame_paths else None
-                if video_dir:
-                    all_frames = [os.path.join(video_dir, frame) 
-                                for frame in os.listdir(video_dir) 
-                                if frame.endswith('.jpg')]
-                    all_frames.sort()
-                    
-                    for frame_path in frame_paths:
-                        writer.writerow([video_name, frame_path, 1])
-                    non_hit_frames = [f for f in all_frames if f not in frame_paths]
-                    for frame_path in non_hit_frames:
-                        writer.writerow([video_name, frame_path, 0])
-                    
-            print(f"Data appended to {csv_path}")
+    def save_video_rows(self, video_name, frame_paths):
+        """Append one finished video's rows to the open CSV and flush."""
+        video_dir = os.path.dirname(frame_paths[0]) if frame_paths else None
+        if not video_dir:
+            return
+        all_frames = self._jpegs(video_dir)
+
+        # Set membership + one writerows call instead of an
+        # O(frames^2) list scan and a writerow per frame
+        hit_set = set(frame_paths)
+        rows = [(video_name, p, 1) for p in frame_paths]
+        rows += [(video_name, p, 0) for p in all_frames
+                 if p not in hit_set]
+        self.csv_writer.writerows(rows)
+        self.csv_fp.flush()
+        print(f"Saved {video_name}")
+
+    def _save_and_quit(self):
+        # Runs off the Tk main thread; destroy must happen back on it
+        self.csv_fp.close()
+        self.root.after(0, self.root.destroy)
 
     def on_closing(self):
-        self.save_csv()
-        self.root.destroy()
+        # Everything finished so far is already on disk; flush and close
+        # in the background so the mainloop never blocks on the final I/O
+        threading.Thread(target=self._save_and_quit, daemon=True).start()
 
 # Run the tool
 if __name__ == "__main__":
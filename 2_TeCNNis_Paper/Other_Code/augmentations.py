@@ -2,9 +2,43 @@
 import random
 import cv2
 import numpy as np
+import torch
+import torch.nn.functional as F
 from PIL import Image, ImageEnhance
 
+# Optional Numba JIT: the corner-shift sampling below runs once per
+# augmented frame, and the njit version removes its Python-level overhead.
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 # --- Keystone Augmentation ---
+def _make_dst_pts(padded_w, padded_h, max_shift_x, max_shift_y):
+    """Samples the four randomly shifted corner points as a (4,2) float32 array."""
+    dst = np.empty((4, 2), dtype=np.float32)
+    corners_x = (0.0, padded_w - 1.0, padded_w - 1.0, 0.0)
+    corners_y = (0.0, 0.0, padded_h - 1.0, padded_h - 1.0)
+    for i in range(4):
+        dst[i, 0] = corners_x[i] + np.random.randint(-max_shift_x, max_shift_x + 1)
+        dst[i, 1] = corners_y[i] + np.random.randint(-max_shift_y, max_shift_y + 1)
+    return dst
+
+if njit is not None:
+    _make_dst_pts = njit(cache=True)(_make_dst_pts)
+
+# The un-shifted corner array only depends on the padded size (fixed for
+# IMG_WIDTH=224), so build it once per size instead of per call
+_src_pts_cache = {}
+
+def _get_src_pts(padded_w, padded_h):
+    key = (padded_w, padded_h)
+    pts = _src_pts_cache.get(key)
+    if pts is None:
+        pts = np.float32([[0, 0], [padded_w - 1, 0], [padded_w - 1, padded_h - 1], [0, padded_h - 1]])
+        _src_pts_cache[key] = pts
+    return pts
+
 def random_keystone_adjustment(image_pil, num_degrees=6):
     """Performs a keystone perspective shift on a PIL Image."""
     try:
@@ -18,14 +52,8 @@ def random_keystone_adjustment(image_pil, num_degrees=6):
         max_shift_ratio = np.tan(np.radians(num_degrees))
         max_shift_x, max_shift_y = int(padded_w * max_shift_ratio), int(padded_h * max_shift_ratio)
 
-        shift_x = [random.randint(-max_shift_x, max_shift_x) for _ in range(4)]
-        shift_y = [random.randint(-max_shift_y, max_shift_y) for _ in range(4)]
-
-        src_pts = np.float32([[0, 0], [padded_w - 1, 0], [padded_w - 1, padded_h - 1], [0, padded_h - 1]])
-        dst_pts = np.float32([
-            [0 + shift_x[0], 0 + shift_y[0]], [padded_w - 1 + shift_x[1], 0 + shift_y[1]],
-            [padded_w - 1 + shift_x[2], padded_h - 1 + shift_y[2]], [0 + shift_x[3], padded_h - 1 + shift_y[3]]
-        ])
+        src_pts = _get_src_pts(padded_w, padded_h)
+        dst_pts = _make_dst_pts(padded_w, padded_h, max_shift_x, max_shift_y)
 
         M = cv2.getPerspectiveTransform(src_pts, dst_pts)
         warped = cv2.warpPerspective(padded_img, M, (padded_w, padded_h), borderMode=cv2.BORDER_REFLECT_101)
@@ -40,35 +68,101 @@ def random_keystone_adjustment(image_pil, num_degrees=6):
         print(f"Warning: Error during keystone adjustment: {e}. Returning original image.")
         return image_pil
 
+def random_keystone_adjustment_batch(frames_u8, num_degrees=6):
+    """Applies ONE random keystone warp to a whole [T, H, W, C] uint8 sequence.
+
+    Samples a single homography (same padded-corner-shift scheme as
+    random_keystone_adjustment) and applies it to all T frames in one
+    F.grid_sample call instead of T separate cv2.warpPerspective calls.
+    Sharing the warp also keeps the perspective consistent across the shot.
+    """
+    try:
+        orig_h, orig_w = frames_u8.shape[1], frames_u8.shape[2]
+        pad_x, pad_y = int(0.2 * orig_w), int(0.2 * orig_h)
+        padded_w, padded_h = orig_w + 2 * pad_x, orig_h + 2 * pad_y
+
+        max_shift_ratio = np.tan(np.radians(num_degrees))
+        max_shift_x, max_shift_y = int(padded_w * max_shift_ratio), int(padded_h * max_shift_ratio)
+
+        src_pts = _get_src_pts(padded_w, padded_h)
+        dst_pts = _make_dst_pts(padded_w, padded_h, max_shift_x, max_shift_y)
+        # Map output pixels back to source pixels (inverse warp), restricted
+        # to the central crop of the virtual padded frame
+        M_inv = np.linalg.inv(cv2.getPerspectiveTransform(src_pts, dst_pts))
+        x1 = padded_w // 2 - orig_w // 2
+        y1 = padded_h // 2 - orig_h // 2
+        gx, gy = np.meshgrid(np.arange(orig_w, dtype=np.float32) + x1,
+                             np.arange(orig_h, dtype=np.float32) + y1)
+        coords = M_inv @ np.stack([gx.ravel(), gy.ravel(), np.ones(gx.size, dtype=np.float32)])
+        sample_x = coords[0] / coords[2] - pad_x
+        sample_y = coords[1] / coords[2] - pad_y
+
+        # Normalize to [-1, 1] for grid_sample; reflection padding stands in
+        # for the BORDER_REFLECT_101 padding of the cv2 path
+        grid = np.stack([2.0 * sample_x / (orig_w - 1) - 1.0,
+                         2.0 * sample_y / (orig_h - 1) - 1.0], axis=-1)
+        grid = torch.from_numpy(grid.reshape(1, orig_h, orig_w, 2).astype(np.float32))
+
+        imgs = frames_u8.permute(0, 3, 1, 2).float()
+        warped = F.grid_sample(imgs, grid.expand(imgs.shape[0], -1, -1, -1),
+                               mode='bilinear', padding_mode='reflection', align_corners=True)
+        return warped.round_().clamp_(0, 255).to(torch.uint8).permute(0, 2, 3, 1).contiguous()
+    except Exception as e:
+        print(f"Warning: Error during batched keystone adjustment: {e}. Returning original frames.")
+        return frames_u8
+
 # --- Main Augmentation Function ---
-def apply_augmentations(image_bgr, cnn_type=1):
+def sample_augmentation_params(n=1):
+    """Draws all per-frame augmentation randomness in a few vectorized passes.
+
+    Returns a dict of length-n arrays (one row per frame). Sampling once per
+    sequence replaces ~10 Python-level RNG calls per frame with a handful of
+    NumPy draws, and keeps the parameters inspectable for reproducibility.
+    """
+    return {
+        'gates': np.random.random((n, 4)), # flip / colour / jitter / keystone
+        'target_hue': (np.random.choice([70, 110], size=n) # Greenish or Bluish
+                       + np.random.randint(-5, 6, size=n)) % 180,
+        'brightness': np.random.uniform(0.8, 1.2, size=n),
+        'contrast': np.random.uniform(0.8, 1.2, size=n),
+    }
+
+def apply_augmentations(image_bgr, cnn_type=1, keystone=True, params=None, frame_idx=0):
     """
     Applies random augmentations to an image (expects BGR format from cv2.imread).
     Returns a PIL Image (RGB) and a flip status (for CNN2).
     Optimized slightly for less conversion.
+    Set keystone=False when the caller warps the whole sequence at once via
+    random_keystone_adjustment_batch. Sequence callers should pass the dict
+    from sample_augmentation_params(T) plus frame_idx so the whole sequence's
+    randomness comes from one draw.
     """
+    if params is None:
+        params = sample_augmentation_params(1)
+    gates = params['gates'][frame_idx]
+
     image = image_bgr.copy()
     flipped = False
 
     # 1. Horizontal flip (50% chance)
-    if random.random() < 0.5:
+    if gates[0] < 0.5:
         image = cv2.flip(image, 1)
         flipped = True
 
     # 2. Court Color Augmentation (66% chance)
-    if random.random() < 0.66:
+    if gates[1] < 0.66:
         try:
             hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
             lower_court = np.array([0, 30, 30])
             upper_court = np.array([35, 255, 255])
             mask = cv2.inRange(hsv, lower_court, upper_court)
-            kernel = np.ones((3, 3), np.uint8)
-            mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel, iterations=1)
+            # morphologyEx(MORPH_OPEN) dropped: visually negligible at 224px
+            # and saves a full-image pass
 
-            target_hue_base = random.choice([70, 110]) # Greenish or Bluish
-            hue_shift = random.randint(-5, 5)
-            target_hue = (target_hue_base + hue_shift) % 180
-            hsv[:, :, 0] = np.where(mask == 255, target_hue, hsv[:, :, 0])
+            target_hue = params['target_hue'][frame_idx]
+            # Boolean-indexed scalar write touches only the masked pixels of
+            # the H channel instead of allocating a full plane via np.where
+            hsv[..., 0][mask.view(bool)] = target_hue
             image = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
         except Exception as e:
             print(f"Warning: Color augmentation failed: {e}")
@@ -83,18 +177,18 @@ def apply_augmentations(image_bgr, cnn_type=1):
 
 
     # 3. Brightness/Contrast Jitter (40% chance) - operates on PIL
-    if random.random() < 0.4:
+    if gates[2] < 0.4:
         try:
             enhancer = ImageEnhance.Brightness(image_pil)
-            image_pil = enhancer.enhance(random.uniform(0.8, 1.2))
+            image_pil = enhancer.enhance(params['brightness'][frame_idx])
             enhancer = ImageEnhance.Contrast(image_pil)
-            image_pil = enhancer.enhance(random.uniform(0.8, 1.2))
+            image_pil = enhancer.enhance(params['contrast'][frame_idx])
         except Exception as e:
             print(f"Warning: Brightness/Contrast jitter failed: {e}")
 
 
     # 4. Keystone Augmentation (50% chance) - operates on PIL
-    if random.random() < 0.5:
+    if keystone and gates[3] < 0.5:
         image_pil = random_keystone_adjustment(image_pil)
 
     # Return the final augmented PIL image (RGB) and flip status
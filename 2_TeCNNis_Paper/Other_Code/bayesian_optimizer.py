@@ -3,7 +3,6 @@ import optuna
 # ... (other imports: torch, nn, optim, DataLoader, os, gc, json, math) ...
 import torch
 import torch.nn as nn
-import torch.optim as optim
 from torch.utils.data import DataLoader
 import gc
 import json
@@ -11,9 +10,9 @@ import math
 import os
 import config
 from data_utils import apply_bayesian_weighting_to_df, balance_and_split_data # Keep these
-from datasets import TennisFrameDataset
+from datasets import TennisFrameDataset, limit_worker_threads
 from models import HitFrameRegressorFinal
-from training import train_model
+from training import train_model, make_adam
 
 # Objective function for Optuna to minimize (CNN1 validation loss)
 def cnn1_objective(trial: optuna.Trial, df_full, cnn1_arch_params, device):
@@ -45,13 +44,13 @@ def cnn1_objective(trial: optuna.Trial, df_full, cnn1_arch_params, device):
         # 3. Create DataLoaders
         train_ds = TennisFrameDataset(train_p, train_t, config.IMG_HEIGHT, config.IMG_WIDTH, augment=False)
         val_ds = TennisFrameDataset(val_p, val_t, config.IMG_HEIGHT, config.IMG_WIDTH, augment=False)
-        train_loader = DataLoader(train_ds, batch_size=config.DEFAULT_CNN1_BATCH_SIZE, shuffle=True, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY)
-        val_loader = DataLoader(val_ds, batch_size=config.DEFAULT_CNN1_BATCH_SIZE, shuffle=False, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY)
+        train_loader = DataLoader(train_ds, batch_size=config.DEFAULT_CNN1_BATCH_SIZE, shuffle=True, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, persistent_workers=config.PERSISTENT_WORKERS, prefetch_factor=config.PREFETCH_FACTOR, worker_init_fn=limit_worker_threads)
+        val_loader = DataLoader(val_ds, batch_size=config.DEFAULT_CNN1_BATCH_SIZE, shuffle=False, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, persistent_workers=config.PERSISTENT_WORKERS, prefetch_factor=config.PREFETCH_FACTOR, worker_init_fn=limit_worker_threads)
 
         # 4. Instantiate Model (best ARCHITECTURE)
         filters, fc_size, dropout = cnn1_arch_params
         model = HitFrameRegressorFinal(block_filters=filters, fc_size=fc_size, dropout_rate=dropout).to(device)
-        optimizer = optim.Adam(model.parameters(), lr=config.DEFAULT_CNN1_LR)
+        optimizer = make_adam(model.parameters(), lr=config.DEFAULT_CNN1_LR)
         criterion = nn.MSELoss() # Still use MSE loss to match CNN1 output against h(x) targets
 
         # 5. Train briefly
@@ -27,6 +27,11 @@ DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 # Enable CuDNN benchmark mode for potentially faster convolutions if input sizes don't vary much
 # Disable if input sizes change a lot (less common in this type of task)
 cudnn.benchmark = True
+# Allow TF32 matmuls on Ampere+ GPUs: ~8x tensor-core throughput for
+# FP32 convs/matmuls at negligible precision cost for this task
+torch.set_float32_matmul_precision('high')
+cudnn.allow_tf32 = True
+torch.backends.cuda.matmul.allow_tf32 = True
 # print(f"Using device: {DEVICE}")
 
 # --- Default Hyperparameters (can be overridden by loaded best params) ---
@@ -57,8 +62,10 @@ DEFAULT_MIN_IMPROVEMENT = 1e-5 # Min improvement threshold for early stopping
 # Data Loader Efficiency
 # Adjust based on your system's cores and performance profiling
 # Start with 2 or 4, 0 means loading in the main process (can be slow)
-NUM_WORKERS = 4 if DEVICE.type == 'cuda' else 0 # Often benefits from more workers with GPU
+NUM_WORKERS = max(4, (os.cpu_count() or 1) // 2) if DEVICE.type == 'cuda' else 0 # Often benefits from more workers with GPU
 PIN_MEMORY = True if DEVICE.type == 'cuda' else False # Speeds up CPU->GPU transfer
+PERSISTENT_WORKERS = NUM_WORKERS > 0 # Keep workers alive between epochs (no respawn cost)
+PREFETCH_FACTOR = 4 if NUM_WORKERS > 0 else None # Batches queued ahead per worker
 
 # Grid Search Control
 GRID_SEARCH_TUNING_EPOCHS = 5 # Number of epochs for *each* grid search trial
@@ -91,8 +98,10 @@ DEFAULT_CNN2_INPUT_CHANNELS = DEFAULT_N_FRAMES_SEQUENCE_CNN2 * 3
 DEFAULT_FINAL_EPOCHS = 150
 DEFAULT_EARLY_STOPPING_PATIENCE = 15
 DEFAULT_MIN_IMPROVEMENT = 1e-5
-NUM_WORKERS = 4 if DEVICE.type == 'cuda' else 0
+NUM_WORKERS = max(4, (os.cpu_count() or 1) // 2) if DEVICE.type == 'cuda' else 0
 PIN_MEMORY = True if DEVICE.type == 'cuda' else False
+PERSISTENT_WORKERS = NUM_WORKERS > 0
+PREFETCH_FACTOR = 4 if NUM_WORKERS > 0 else None
 
 # --- Grid Search Control ---
 GRID_SEARCH_TUNING_EPOCHS = 5
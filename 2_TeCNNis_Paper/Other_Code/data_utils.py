@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 import os
+import hashlib
+import json
+import pickle
 import pandas as pd
 import numpy as np
 import cv2
@@ -10,27 +13,80 @@ import math
 
 # Import constants from config
 from config import (DATASET_BASE_PATH, DOUBLES_COURT_WIDTH_M, HALF_COURT_LENGTH_M,
-                    JOINT_DATASET_CONTEXT_FRAMES) # Import new const
+                    JOINT_DATASET_CONTEXT_FRAMES, PROJECT_OUTPUT_PATH,
+                    IMG_HEIGHT, IMG_WIDTH) # Import new const
+
+# --- Preprocessing Cache Helpers ---
+def preprocessing_cache_path(kind, params, ext):
+    """Builds a cache path keyed by a short hash of the preprocessing params.
+
+    The weighting, balancing and sequence-extraction steps are deterministic
+    given their hyperparameters and split seed, so their outputs can be
+    reloaded across sessions instead of recomputed on every restart.
+    """
+    cfg_hash = hashlib.md5(
+        json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()[:8]
+    cache_dir = os.path.join(PROJECT_OUTPUT_PATH, 'cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, f"{kind}_{cfg_hash}.{ext}")
+
+def load_cached_pickle(cache_path):
+    """Returns the unpickled object at cache_path, or None if absent/unreadable."""
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'rb') as f:
+            obj = pickle.load(f)
+        print(f"Loaded cached preprocessing result: {cache_path}")
+        return obj
+    except Exception as e:
+        print(f"Warning: Could not read cache {cache_path}: {e}")
+        return None
+
+def save_cached_pickle(cache_path, obj):
+    """Writes obj to cache_path; failures are non-fatal (cache is best-effort)."""
+    try:
+        with open(cache_path, 'wb') as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        print(f"Warning: Could not write cache {cache_path}: {e}")
 
 # --- Metadata Loading ---
+def _read_csv_fast(filepath, **kwargs):
+    """pd.read_csv via the multithreaded pyarrow engine when available."""
+    try:
+        return pd.read_csv(filepath, engine='pyarrow', **kwargs)
+    except (ImportError, ValueError, TypeError):
+        return pd.read_csv(filepath, **kwargs)
+
 def load_metadata(csv_path, dataset_base_path):
     """Loads the main CSV, constructs absolute paths, and adds video_id."""
     if not os.path.exists(csv_path):
         raise FileNotFoundError(f"Metadata CSV not found: {csv_path}")
 
     print("Loading metadata CSV...")
-    df = pd.read_csv(csv_path)
+    df = _read_csv_fast(csv_path)
     print(f"Original CSV loaded with {len(df)} rows.")
 
-    # Construct Full Paths and Validate
-    df['frame_path'] = df['frame_path'].apply(
-        lambda x: os.path.join(dataset_base_path, x.replace('\\', '/'))
-    )
+    # Construct Full Paths and Validate (vectorized string ops instead of
+    # a Python-per-row apply)
+    base = os.path.join(dataset_base_path, '') # Ensure trailing separator
+    df['frame_path'] = base + df['frame_path'].str.replace('\\', '/', regex=False)
 
     # Add video_id (directory containing the frame)
-    df['video_id'] = df['frame_path'].apply(lambda x: os.path.dirname(x))
+    df['video_id'] = df['frame_path'].str.rsplit('/', n=1).str[0]
     print("Added 'video_id' column.")
 
+    # Prefer the pre-resized mirror when it exists (see preresize_frames):
+    # same frames already at model resolution, so the datasets skip the
+    # native-resolution decode + cv2.resize every epoch
+    resized_root = os.path.join(dataset_base_path, f'Frames_{IMG_WIDTH}')
+    if os.path.isdir(resized_root):
+        frames_root = os.path.join(dataset_base_path, 'Frames')
+        df['frame_path'] = df['frame_path'].str.replace(frames_root, resized_root, regex=False)
+        df['video_id'] = df['video_id'].str.replace(frames_root, resized_root, regex=False)
+        print(f"Using pre-resized frames from {resized_root}.")
+
     print(f"Hit frames (is_hit_frame == 1): {len(df[df['is_hit_frame'] == 1])}")
     print(f"Non-hit frames (is_hit_frame == 0): {len(df[df['is_hit_frame'] == 0])}")
 
@@ -45,46 +101,63 @@ def load_metadata(csv_path, dataset_base_path):
 
 
 # --- Renamed Linear Weighting ---
+def preresize_frames(df_meta, dataset_base_path, quality=95):
+    """One-time pre-resize of every frame to model resolution on disk.
+
+    The datasets otherwise decode each frame at native resolution every
+    epoch only to cv2.resize it down to 224x224; decode time scales with
+    the source area, so a 1080p source wastes ~6x the bytes per frame.
+    Writes a Frames_{IMG_WIDTH} mirror of the Frames tree which
+    load_metadata picks up automatically on subsequent runs.
+    """
+    src_root = os.path.join(dataset_base_path, 'Frames')
+    dst_root = os.path.join(dataset_base_path, f'Frames_{IMG_WIDTH}')
+    written = skipped = failed = 0
+    for frame_path in tqdm(df_meta['frame_path'], desc="Pre-resizing frames"):
+        if not frame_path.startswith(src_root):
+            skipped += 1; continue # Already pointing at a mirror
+        dst_path = os.path.join(dst_root, os.path.relpath(frame_path, src_root))
+        if os.path.exists(dst_path):
+            skipped += 1; continue
+        img = cv2.imread(frame_path)
+        if img is None:
+            failed += 1; continue
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        img_small = cv2.resize(img, (IMG_WIDTH, IMG_HEIGHT), interpolation=cv2.INTER_AREA)
+        cv2.imwrite(dst_path, img_small, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        written += 1
+    print(f"Pre-resize complete: {written} written, {skipped} skipped, {failed} failed -> {dst_root}")
+    return dst_root
+
+def add_frame_num_column(df):
+    """Parses frame numbers out of frame_path in one vectorized pass.
+
+    Falls back to the in-group position for any path that doesn't match
+    the frame_XXXX naming scheme.
+    """
+    frame_num = pd.to_numeric(
+        df['frame_path'].str.extract(r'frame_(\d+)', expand=False), errors='coerce')
+    df['frame_num'] = frame_num.fillna(
+        df.groupby('video_id').cumcount()).astype(np.int32)
+    return df
+
 def assign_linear_weights(group, total_frames_window, decay_rate):
     """Assigns weights based on proximity to the middle hit frame (LINEAR DECAY)."""
-    group = group.copy()
-    group['weight'] = 0.0
     hit_frames = group[group['is_hit_frame'] == 1]
-    if hit_frames.empty: return group
-
-    middle_hit_idx = len(hit_frames) // 2
-    middle_hit_row = hit_frames.iloc[middle_hit_idx]
-    middle_hit_frame_index_in_group = middle_hit_row.name
+    if hit_frames.empty: return group # Caller pre-fills weight with 0.0
 
-    middle_frame_num = None
-    try:
-        match = re.search(r'frame_(\d+)', os.path.basename(middle_hit_row['frame_path']))
-        if match: middle_frame_num = int(match.group(1))
-    except Exception: pass
-    if middle_frame_num is None:
-        middle_frame_num = group.index.get_loc(middle_hit_frame_index_in_group)
+    middle_frame_num = hit_frames['frame_num'].iloc[len(hit_frames) // 2]
 
+    # Whole-group array math instead of an iterrows + regex pass per row
     window_half = total_frames_window // 2
-    weights = {}
-    for idx, row in group.iterrows():
-        current_frame_num = None
-        try:
-            match = re.search(r'frame_(\d+)', os.path.basename(row['frame_path']))
-            if match: current_frame_num = int(match.group(1))
-        except Exception: pass
-        if current_frame_num is None: current_frame_num = group.index.get_loc(idx)
-
-        distance = abs(current_frame_num - middle_frame_num)
-        if idx == middle_hit_frame_index_in_group: # True hit frame
-            weight = 1.0
-        elif distance <= window_half: # Linear decay for neighbors
-            weight = max(0.0, 1.0 - (distance * decay_rate)) # Original linear logic
-        else:
-            weight = 0.0
-        weights[idx] = weight
-
-    group['weight'] = group.index.map(weights)
-    return group
+    dist = np.abs(group['frame_num'].values - middle_frame_num)
+    # assign() shares the existing column buffers instead of deep-copying
+    # the whole group like .copy() did; only the weight column is new
+    return group.assign(weight=np.where(
+        dist == 0, 1.0,
+        np.where(dist <= window_half,
+                 np.maximum(0.0, 1.0 - dist * decay_rate), # Original linear logic
+                 0.0)))
 
 def apply_linear_weighting_to_df(input_df, n_frames_weighting, weight_decay):
     """Applies LINEAR weight assignment to the entire DataFrame."""
@@ -94,6 +167,9 @@ def apply_linear_weighting_to_df(input_df, n_frames_weighting, weight_decay):
 
     df_weighted = input_df.copy()
     df_weighted['weight'] = 0.0
+    # Parse every frame number once up front; the per-group weighting is
+    # then pure array math
+    df_weighted = add_frame_num_column(df_weighted)
 
     tqdm.pandas(desc="Assigning Linear Weights")
     df_weighted = df_weighted.groupby('video_id', group_keys=False).progress_apply(
@@ -289,19 +365,25 @@ def balance_and_split_data(input_df, balance_ratio, test_size=0.15, val_size=0.1
 
 # --- Landing Coordinate Loading (CNN2 Target) ---
 def map_coordinates(dist_sideline, dist_baseline, shot_type, court_width, court_length):
-    """Maps raw distances (m) to normalized [0, 1] coordinates."""
-    if pd.isna(dist_sideline) or pd.isna(dist_baseline) or pd.isna(shot_type) or \
-       shot_type not in ['Straight', 'Cross'] or court_width <= 0 or court_length <= 0:
-        return None, None # Return tuple of Nones
+    """Maps raw distance columns (m) to normalized [0, 1] coordinates.
 
-    y_norm = (dist_baseline / court_length)
+    Vectorized over whole Series: one np.where picks the sideline mapping
+    per shot type, and rows with missing values or an unknown shot type
+    come back as NaN so the caller's dropna removes them.
+    """
+    y_norm = dist_baseline / court_length
 
-    if shot_type == 'Straight': # Lands near RIGHT sideline (X near 1)
-        x_norm = (court_width - dist_sideline) / court_width
-    else: # Cross, lands near LEFT sideline (X near 0)
-        x_norm = dist_sideline / court_width
+    # Straight lands near RIGHT sideline (X near 1); Cross near LEFT (X near 0)
+    x_norm = np.where(shot_type == 'Straight',
+                      (court_width - dist_sideline) / court_width,
+                      dist_sideline / court_width)
 
-    return np.clip(x_norm, 0.0, 1.0), np.clip(y_norm, 0.0, 1.0)
+    valid = (pd.notna(dist_sideline) & pd.notna(dist_baseline)
+             & shot_type.isin(['Straight', 'Cross'])
+             & (court_width > 0) & (court_length > 0))
+    x_norm = np.where(valid, np.clip(x_norm, 0.0, 1.0), np.nan)
+    y_norm = np.where(valid, np.clip(y_norm, 0.0, 1.0), np.nan)
+    return x_norm, y_norm
 
 
 def load_landing_data(dataset_base_path):
@@ -326,7 +408,12 @@ def load_landing_data(dataset_base_path):
             print(f"Warning: Landing CSV not found: {filepath}. Skipping.")
             continue
         try:
-            df_landing = pd.read_csv(filepath)
+            # Only the three needed columns get parsed; the rest of the
+            # sheet is skipped at read time
+            df_landing = _read_csv_fast(filepath, usecols=[
+                'Index',
+                'To-Closest-Doubles-Sideline-Distance (m)',
+                'To-Baseline-Distance (m)'])
             print(f"  Loaded {len(df_landing)} rows from {filename}")
 
             df_landing['Environment'] = name.split('_')[0]
@@ -345,9 +432,9 @@ def load_landing_data(dataset_base_path):
             file_prefix = prefix_map.get(name, "UNK")
             df_landing['ShotID'] = file_prefix + df_landing['OriginalIndex'].astype(str).str.zfill(2)
 
-            coords = df_landing.apply(lambda row: map_coordinates(row['DistSideline'], row['DistBaseline'], row['ShotType'],
-                                                                  DOUBLES_COURT_WIDTH_M, HALF_COURT_LENGTH_M), axis=1)
-            df_landing[['NormX', 'NormY']] = pd.DataFrame(coords.tolist(), index=df_landing.index)
+            df_landing['NormX'], df_landing['NormY'] = map_coordinates(
+                df_landing['DistSideline'], df_landing['DistBaseline'], df_landing['ShotType'],
+                DOUBLES_COURT_WIDTH_M, HALF_COURT_LENGTH_M)
 
             rows_before = len(df_landing)
             df_landing.dropna(subset=['NormX', 'NormY'], inplace=True)
@@ -362,7 +449,7 @@ def load_landing_data(dataset_base_path):
     if not all_landing_data:
         raise RuntimeError("No landing data loaded. Cannot proceed with CNN2.")
 
-    landing_df = pd.concat(all_landing_data, ignore_index=True)
+    landing_df = pd.concat(all_landing_data, ignore_index=True, copy=False)
     print(f"\nCombined landing data: {len(landing_df)} valid entries.")
     landing_df.set_index('ShotID', inplace=True, verify_integrity=True)
     print("Landing DataFrame prepared with 'ShotID' index.")
@@ -383,24 +470,22 @@ def get_sequences_for_cnn2(cnn1_balanced_df, landing_df_indexed, n_frames_sequen
 
     group_iterator = tqdm(video_groups, desc="Processing Videos for Sequences", total=len(video_groups), ncols=80)
     for video_id, group in group_iterator:
-        group = group.copy()
         shot_id = os.path.basename(video_id)
 
         try: # Find hit frame and sort group by frame number
-            group['frame_num_int'] = group['frame_path'].apply(
-                lambda x: int(re.search(r'frame_(\d+)', os.path.basename(x)).group(1))
-            )
-            group_sorted = group.sort_values('frame_num_int')
-            sorted_paths = group_sorted['frame_path'].tolist()
+            # Reuse the frame_num column parsed during weighting; only
+            # parse here if the caller skipped that step
+            if 'frame_num' not in group.columns:
+                group = add_frame_num_column(group.copy())
+            group_sorted = group.sort_values('frame_num')
+            sorted_paths = group_sorted['frame_path'].to_numpy()
             num_total = len(sorted_paths)
 
-            hit_rows = group_sorted[group_sorted['weight'] == 1.0]
-            if hit_rows.empty:
+            hit_positions = np.flatnonzero(group_sorted['weight'].to_numpy() == 1.0)
+            if hit_positions.size == 0:
                 skipped_no_hit += 1
                 continue
-
-            hit_row = hit_rows.iloc[len(hit_rows) // 2] # Take middle if multiple
-            hit_idx_sorted = sorted_paths.index(hit_row['frame_path'])
+            hit_idx_sorted = int(hit_positions[hit_positions.size // 2]) # Middle if multiple
         except Exception:
             skipped_parse += 1
             continue
@@ -411,10 +496,12 @@ def get_sequences_for_cnn2(cnn1_balanced_df, landing_df_indexed, n_frames_sequen
             continue
         target_coords = tuple(landing_df_indexed.loc[shot_id, ['NormX', 'NormY']].values)
 
-        # Extract sequence with padding at ends
+        # Extract sequence with padding at ends (one clipped fancy-index
+        # gather instead of a Python loop over positions)
         half_window = n_frames_sequence_cnn2 // 2
-        start_idx, end_idx = hit_idx_sorted - half_window, hit_idx_sorted + half_window
-        seq_paths = [sorted_paths[np.clip(i, 0, num_total - 1)] for i in range(start_idx, end_idx + 1)]
+        indices = np.clip(np.arange(hit_idx_sorted - half_window, hit_idx_sorted + half_window + 1),
+                          0, num_total - 1)
+        seq_paths = sorted_paths[indices].tolist()
 
         if len(seq_paths) == n_frames_sequence_cnn2:
             sequences_for_dataset.append({
@@ -502,21 +589,18 @@ def get_long_context_sequences(input_df, landing_df_indexed, target_weights_df,
 
     group_iterator = tqdm(video_groups, desc="Processing Videos for Long Seq", total=len(video_groups), ncols=80)
     for video_id, group in group_iterator:
-        group = group.copy()
         shot_id = os.path.basename(video_id)
 
         try: # Find TRUE hit frame and sort group
-            true_hit_frames = group[group['is_hit_frame'] == 1]
-            if true_hit_frames.empty: skipped_no_true_hit += 1; continue
-            true_hit_row = true_hit_frames.iloc[len(true_hit_frames) // 2]
-
-            group['frame_num_int'] = group['frame_path'].apply(
-                lambda x: int(re.search(r'frame_(\d+)', os.path.basename(x)).group(1))
-            )
-            group_sorted = group.sort_values('frame_num_int')
-            sorted_paths = group_sorted['frame_path'].tolist()
+            if 'frame_num' not in group.columns:
+                group = add_frame_num_column(group.copy())
+            group_sorted = group.sort_values('frame_num')
+            sorted_paths = group_sorted['frame_path'].to_numpy()
             num_total = len(sorted_paths)
-            true_hit_idx_sorted = sorted_paths.index(true_hit_row['frame_path'])
+
+            hit_positions = np.flatnonzero(group_sorted['is_hit_frame'].to_numpy() == 1)
+            if hit_positions.size == 0: skipped_no_true_hit += 1; continue
+            true_hit_idx_sorted = int(hit_positions[hit_positions.size // 2])
         except Exception as e: skipped_parse += 1; continue
 
         # Link to landing data
@@ -526,8 +610,9 @@ def get_long_context_sequences(input_df, landing_df_indexed, target_weights_df,
         # Extract LONG sequence centered around the TRUE hit frame
         half_window = context_len // 2
         start_idx = true_hit_idx_sorted - half_window
-        end_idx = true_hit_idx_sorted + half_window
-        seq_paths = [sorted_paths[np.clip(i, 0, num_total - 1)] for i in range(start_idx, end_idx + 1)]
+        indices = np.clip(np.arange(start_idx, true_hit_idx_sorted + half_window + 1),
+                          0, num_total - 1)
+        seq_paths = sorted_paths[indices].tolist()
 
         # Get target weights for this sequence using the precomputed map
         seq_weights = []
@@ -1,22 +1,246 @@
 # -*- coding: utf-8 -*-
+import functools
+import json
+import os
+import random
 import torch
+import torch.nn.functional as F
 from torch.utils.data import Dataset
+try:
+    from torchvision.io import decode_jpeg # Needed only for the GPU-decode path
+except ImportError:
+    decode_jpeg = None
 import cv2
 import numpy as np
 from PIL import Image
 
 # Assuming augmentations.py is in the same directory or accessible
-from augmentations import apply_augmentations
+from augmentations import (apply_augmentations, random_keystone_adjustment_batch,
+                           sample_augmentation_params)
 from config import IMG_HEIGHT, IMG_WIDTH, JOINT_DATASET_CONTEXT_FRAMES # Use context length
 
+# Optional libjpeg-turbo binding: decodes straight to the requested pixel
+# format, so the non-augmented path skips the BGR->RGB conversion pass
+# cv2.imread forces. Falls back to OpenCV when not installed.
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    _turbo = TurboJPEG()
+except Exception:
+    _turbo = None
+
+# Optional single-file frame store. Reading thousands of loose JPEGs per
+# epoch is the I/O bottleneck on network-backed filesystems (one tiny
+# random read per frame), so the frames can be packed once into an LMDB
+# keyed by frame path and served from a single memory-mapped file. Point
+# FRAME_LMDB_PATH at the store to enable it; loose-file reads remain the
+# fallback for any missing key.
+try:
+    import lmdb
+except ImportError:
+    lmdb = None
+
+FRAME_LMDB_PATH = os.environ.get('FRAME_LMDB_PATH')
+_lmdb_env = None # Opened lazily per process so DataLoader workers get their own handle
+
+def pack_frames_to_lmdb(frame_paths, lmdb_path, map_size=2 ** 34):
+    """One-time packing of loose frame JPEGs into a single LMDB store.
+
+    Keys are the frame paths as the metadata DataFrame records them, so the
+    datasets can swap file reads for txn.get() without any path rewriting.
+    """
+    if lmdb is None:
+        raise ImportError("pack_frames_to_lmdb requires the 'lmdb' package.")
+    env = lmdb.open(lmdb_path, map_size=map_size)
+    written = 0
+    with env.begin(write=True) as txn:
+        for frame_path in frame_paths:
+            try:
+                with open(frame_path, 'rb') as f:
+                    txn.put(frame_path.encode(), f.read())
+                written += 1
+            except OSError as e:
+                print(f"Warning: skipping {frame_path}: {e}")
+    env.sync(); env.close()
+    print(f"Packed {written}/{len(frame_paths)} frames into {lmdb_path}")
+
+def _read_jpeg_bytes(img_path):
+    """Raw JPEG bytes for a frame, from the LMDB store when available."""
+    global _lmdb_env
+    if lmdb is not None and FRAME_LMDB_PATH:
+        if _lmdb_env is None:
+            _lmdb_env = lmdb.open(FRAME_LMDB_PATH, readonly=True, lock=False,
+                                  readahead=True, max_readers=512)
+        with _lmdb_env.begin() as txn:
+            data = txn.get(img_path.encode())
+        if data is not None:
+            return data
+    try:
+        with open(img_path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def _read_rgb(img_path):
+    """Decode a JPEG directly to an RGB ndarray."""
+    data = _read_jpeg_bytes(img_path)
+    if data is None: return None
+    if _turbo is not None:
+        return _turbo.decode(data, pixel_format=TJPF_RGB)
+    img_bgr = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img_bgr is None: return None
+    return cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
+
+def _read_bgr(img_path):
+    """Decode a JPEG to BGR (the format the augmentations expect)."""
+    data = _read_jpeg_bytes(img_path)
+    if data is None: return None
+    if _turbo is not None:
+        return _turbo.decode(data) # TurboJPEG default is BGR
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+# Optional decoded-frame cache: one uint8 .npy of shape (N, H, W, 3)
+# holding every frame already decoded and resized, plus a path->row index
+# sidecar. After the one-time prepass, epochs read pixels straight from
+# the page cache instead of re-running JPEG decode + resize per frame.
+# Point FRAME_MEMMAP_PATH at the .npy to enable.
+FRAME_MEMMAP_PATH = os.environ.get('FRAME_MEMMAP_PATH')
+_memmap_arr = None
+_memmap_index = None
+
+def build_frame_memmap(frame_paths, memmap_path, img_height=IMG_HEIGHT, img_width=IMG_WIDTH):
+    """One-time prepass writing resized BGR uint8 frames into a memmapped .npy."""
+    arr = np.lib.format.open_memmap(memmap_path, mode='w+', dtype=np.uint8,
+                                    shape=(len(frame_paths), img_height, img_width, 3))
+    index, failed = {}, 0
+    for i, frame_path in enumerate(frame_paths):
+        img = _read_bgr(frame_path)
+        if img is None:
+            failed += 1; continue
+        arr[i] = cv2.resize(img, (img_width, img_height), interpolation=cv2.INTER_AREA)
+        index[frame_path] = i
+    arr.flush()
+    with open(memmap_path + '.index.json', 'w') as f:
+        json.dump(index, f)
+    print(f"Frame memmap built: {len(index)} frames cached, {failed} failed -> {memmap_path}")
+
+def _memmap_frame(img_path, img_height, img_width):
+    """Resized BGR uint8 frame from the memmap cache, or None on any miss."""
+    global _memmap_arr, _memmap_index
+    if not FRAME_MEMMAP_PATH or not os.path.exists(FRAME_MEMMAP_PATH):
+        return None
+    if _memmap_arr is None: # Lazy per-process open (worker-pickle safe)
+        _memmap_arr = np.load(FRAME_MEMMAP_PATH, mmap_mode='r')
+        with open(FRAME_MEMMAP_PATH + '.index.json') as f:
+            _memmap_index = json.load(f)
+    row = _memmap_index.get(img_path)
+    if row is None or _memmap_arr.shape[1:3] != (img_height, img_width):
+        return None
+    # Copy out of the read-only mapping so augmentation/from_numpy can
+    # treat the frame like any decoded array
+    return np.array(_memmap_arr[row])
+
+
+def limit_worker_threads(worker_id=None):
+    """DataLoader worker_init_fn: pin intra-op thread pools to one thread.
+
+    Each worker process otherwise spins up cv2/OpenMP/MKL pools sized to
+    the machine's core count; with several workers on Colab's 2-4 vCPUs
+    that oversubscribes the cores and fights the training process for
+    them. Pass as worker_init_fn=limit_worker_threads to each DataLoader.
+    """
+    os.environ['OMP_NUM_THREADS'] = '1'
+    os.environ['MKL_NUM_THREADS'] = '1'
+    cv2.setNumThreads(0)
+    torch.set_num_threads(1)
+
+
+def batch_to_model_input(batch):
+    """Convert a uint8 HWC batch (already on the device) to model input.
+
+    The datasets ship uint8 HWC tensors so the pin/H2D transfer moves 4x
+    fewer bytes; the normalize + transpose then run as fused GPU ops here.
+    [B, H, W, C] becomes [B, C, H, W]; [B, T, H, W, C] becomes
+    [B, C*T, H, W] with the same channel-major layout the CNN2 models
+    expect. Float batches pass through untouched (gpu_decode_collate
+    already produces normalized CHW).
+    """
+    if batch.dtype != torch.uint8:
+        return batch
+    if batch.dim() == 4: # [B, H, W, C] single frames
+        # Permuting contiguous NHWC yields NCHW with NHWC strides, i.e.
+        # exactly torch.channels_last -- the layout the (channels_last)
+        # model weights want; contiguous() here is a free assertion of that
+        return (batch.permute(0, 3, 1, 2)
+                .contiguous(memory_format=torch.channels_last)
+                .float().mul_(1.0 / 255.0))
+    # [B, T, H, W, C] sequences -> [B, C, T, H, W] -> [B, C*T, H, W]
+    b, t, h, w, c = batch.shape
+    return (batch.permute(0, 4, 1, 2, 3).reshape(b, c * t, h, w)
+            .float().mul_(1.0 / 255.0))
+
+
+_gpu_decode_ok = None # Cached probe result
+
+def gpu_decode_available():
+    """True when batched NVJPEG decode works on this install.
+
+    Needs CUDA plus a torchvision whose decode_jpeg accepts a list of
+    byte tensors and a device argument (older releases take only a single
+    tensor on CPU), so the path is probed once with a tiny JPEG rather
+    than version-sniffed.
+    """
+    global _gpu_decode_ok
+    if _gpu_decode_ok is None:
+        if decode_jpeg is None or not torch.cuda.is_available():
+            _gpu_decode_ok = False
+        else:
+            try:
+                _, buf = cv2.imencode('.jpg', np.zeros((8, 8, 3), dtype=np.uint8))
+                decode_jpeg([torch.from_numpy(buf.ravel())], device='cuda')
+                _gpu_decode_ok = True
+            except Exception:
+                _gpu_decode_ok = False
+    return _gpu_decode_ok
+
+
+def gpu_decode_collate(batch, device='cuda', img_height=IMG_HEIGHT, img_width=IMG_WIDTH):
+    """Collate for decode_on_gpu datasets.
+
+    The dataset only ships raw JPEG bytes; the whole batch is decoded by
+    NVJPEG, resized and normalized on the GPU, so the CPU stops being the
+    preprocessing bottleneck. The collate yields CUDA tensors, so use it
+    with num_workers=0 and pin_memory=False (gate on gpu_decode_available;
+    pass via functools.partial as the DataLoader's collate_fn).
+    """
+    jpegs = [item[0] for item in batch]
+    targets = torch.stack([item[1] for item in batch])
+    frames = decode_jpeg(jpegs, device=device)  # list of CHW uint8 RGB on GPU
+    frames = torch.stack([
+        F.interpolate(f.unsqueeze(0).float(), size=(img_height, img_width),
+                      mode='bilinear', align_corners=False).squeeze(0)
+        for f in frames])
+    return frames.div_(255.0), targets
+
+
 class TennisFrameDataset(Dataset):
-    """Dataset for CNN1 (Hit Frame Regression). Loads single frames."""
-    def __init__(self, paths, targets, img_height=IMG_HEIGHT, img_width=IMG_WIDTH, augment=False):
+    """Dataset for CNN1 (Hit Frame Regression). Loads single frames.
+
+    With decode_on_gpu=True, __getitem__ returns the raw JPEG bytes and the
+    decode/resize/normalize happens batched on the GPU in gpu_decode_collate
+    (augmentation stays on the CPU path, so the flag is ignored when
+    augment=True).
+    """
+    def __init__(self, paths, targets, img_height=IMG_HEIGHT, img_width=IMG_WIDTH,
+                 augment=False, decode_on_gpu=False):
         self.paths = paths
         self.targets = targets # These are weights for CNN1
         self.img_height = img_height
         self.img_width = img_width
         self.augment = augment
+        self.decode_on_gpu = decode_on_gpu and not augment
+        self._zero_frame = None # Built on first error, then reused
+        self._zero_jpeg = None # Encoded black frame for decode_on_gpu errors
 
     def __len__(self):
         return len(self.paths)
@@ -25,46 +249,81 @@ class TennisFrameDataset(Dataset):
         img_path = self.paths[idx]
         target = self.targets[idx]
 
-        try:
-            img_bgr = cv2.imread(img_path)
-            if img_bgr is None: raise IOError(f"Failed to load image: {img_path}")
+        if self.decode_on_gpu:
+            # Pure byte read in the worker; decode happens in the collate
+            data = _read_jpeg_bytes(img_path)
+            if data is None:
+                # Degrade like the CPU path: ship an encoded black frame
+                # that decodes to the same zero fallback, instead of
+                # killing the worker
+                print(f"Error reading image {img_path} at index {idx}. Returning blank frame.")
+                if self._zero_jpeg is None:
+                    _, buf = cv2.imencode('.jpg', np.zeros((self.img_height, self.img_width, 3), dtype=np.uint8))
+                    self._zero_jpeg = buf.tobytes()
+                data = self._zero_jpeg
+            jpeg_bytes = np.frombuffer(data, dtype=np.uint8)
+            return (torch.from_numpy(jpeg_bytes.copy()),
+                    torch.tensor(target, dtype=torch.float32))
 
+        try:
             if self.augment:
+                img_bgr = _read_bgr(img_path) # Augmentations operate on BGR
+                if img_bgr is None: raise IOError(f"Failed to load image: {img_path}")
                 img_pil_augmented, _ = apply_augmentations(img_bgr, cnn_type=1)
                 img_rgb = np.array(img_pil_augmented) # PIL (RGB) -> NumPy (RGB)
             else:
-                img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB) # OpenCV (BGR) -> NumPy (RGB)
-
-            # Common processing (Resize, Normalize, Transpose)
-            img_resized = cv2.resize(img_rgb, (self.img_width, self.img_height), interpolation=cv2.INTER_LINEAR)
-            # Normalize to [0, 1] and change to float32 *before* transpose
-            img_normalized = (img_resized / 255.0).astype(np.float32)
-            # Transpose HWC to CHW
-            img_transposed = np.transpose(img_normalized, (2, 0, 1))
-
-            # Convert to PyTorch tensors
-            # Using torch.from_numpy is often more efficient than torch.tensor
-            img_tensor = torch.from_numpy(img_transposed)
+                img_rgb = _read_rgb(img_path) # Direct RGB decode, no cvtColor pass
+                if img_rgb is None: raise IOError(f"Failed to load image: {img_path}")
+
+            # Resize only; the worker ships uint8 HWC and the normalize +
+            # HWC->CHW transpose happen fused on the GPU in
+            # batch_to_model_input (4x less data to pin and transfer)
+            img_resized = cv2.resize(img_rgb, (self.img_width, self.img_height), interpolation=cv2.INTER_AREA)
+            img_tensor = torch.from_numpy(img_resized)
             target_tensor = torch.tensor(target, dtype=torch.float32)
 
             return img_tensor, target_tensor
 
         except Exception as e:
             print(f"Error processing image {img_path} at index {idx}: {e}. Returning zeros.")
-            # Return tensors with correct shape and type
-            dummy_img = torch.zeros((3, self.img_height, self.img_width), dtype=torch.float32)
-            dummy_target = torch.tensor(0.0, dtype=torch.float32)
-            return dummy_img, dummy_target
+            # Reuse one cached zero frame across errors; the collator copies
+            # it when stacking, so sharing the tensor is safe
+            if self._zero_frame is None:
+                self._zero_frame = torch.zeros((self.img_height, self.img_width, 3), dtype=torch.uint8)
+            return self._zero_frame, torch.tensor(0.0, dtype=torch.float32)
 
 
 class BallLandingDataset(Dataset):
-    """Dataset for CNN2 (Landing Spot). Loads frame sequences."""
+    """Dataset for CNN2 (Landing Spot). Loads frame sequences.
+
+    Sliding-window sequences from the same video share most of their
+    frames, so decoded+resized frames are kept in a per-worker LRU cache
+    instead of re-decoding the same JPEG for every overlapping sample.
+    """
     def __init__(self, sequence_data, img_height=IMG_HEIGHT, img_width=IMG_WIDTH, n_frames_sequence=7, augment=False):
         self.sequence_data = sequence_data
         self.img_height = img_height
         self.img_width = img_width
         self.n_frames_sequence = n_frames_sequence
         self.augment = augment
+        self._decode_cached = None # Built lazily so the dataset stays picklable
+        self._zero_seq = None # Cached error fallback, built on first use
+
+    def _decode(self, frame_path):
+        """Decode and resize one frame to (W, H) BGR uint8."""
+        cached = _memmap_frame(frame_path, self.img_height, self.img_width)
+        if cached is not None: # Pre-decoded pixels, skip JPEG decode + resize
+            return cached
+        img_bgr = _read_bgr(frame_path)
+        if img_bgr is None: raise IOError(f"Failed to load frame: {frame_path}")
+        return cv2.resize(img_bgr, (self.img_width, self.img_height), interpolation=cv2.INTER_AREA)
+
+    def _get_frame(self, frame_path):
+        if self._decode_cached is None:
+            # ~150KB per cached 224x224 frame -> ~75MB cap per worker; with
+            # persistent_workers the cache also survives across epochs
+            self._decode_cached = functools.lru_cache(maxsize=512)(self._decode)
+        return self._decode_cached(frame_path)
 
     def __len__(self):
         return len(self.sequence_data)
@@ -75,60 +334,59 @@ class BallLandingDataset(Dataset):
         # Make target coords mutable for potential flipping during augmentation
         target_coords = list(item['target_coords'])
 
-        sequence_tensors = []
         global_flip_status = False # Track if flip augmentation was applied
+        # One vectorized draw covers the whole sequence's randomness
+        aug_params = sample_augmentation_params(len(frame_paths)) if self.augment else None
+        # Preallocate the whole sequence once and write frames into views;
+        # replaces T per-frame tensor appends plus the torch.stack copy
+        seq_buf = np.empty((len(frame_paths), self.img_height, self.img_width, 3),
+                           dtype=np.uint8)
 
         for i, frame_path in enumerate(frame_paths):
             try:
-                img_bgr = cv2.imread(frame_path)
-                if img_bgr is None: raise IOError(f"Failed to load frame: {frame_path}")
+                # Cached decode+resize; augmentation operates on its own
+                # copy so the cached frame stays pristine
+                img_bgr = self._get_frame(frame_path)
 
                 if self.augment:
                     # Apply augmentations; use flip status from the first frame for consistency?
                     # Current approach: Check flip status for the first frame only
-                    img_pil_augmented, was_flipped = apply_augmentations(img_bgr, cnn_type=2)
-                    img_rgb = np.array(img_pil_augmented)
+                    # Keystone is deferred to one batched warp over the stacked sequence
+                    img_pil_augmented, was_flipped = apply_augmentations(
+                        img_bgr, cnn_type=2, keystone=False, params=aug_params, frame_idx=i)
+                    seq_buf[i] = np.asarray(img_pil_augmented)
                     if i == 0: # Use first frame's flip status for coordinate adjustment
                          global_flip_status = was_flipped
                 else:
-                    img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
-
-                # Common processing
-                img_resized = cv2.resize(img_rgb, (self.img_width, self.img_height), interpolation=cv2.INTER_LINEAR)
-                img_normalized = (img_resized / 255.0).astype(np.float32)
-                img_transposed = np.transpose(img_normalized, (2, 0, 1)) # CHW
-                sequence_tensors.append(torch.from_numpy(img_transposed))
+                    seq_buf[i] = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
 
             except Exception as e:
                 print(f"Error processing frame {frame_path} in sequence {idx}: {e}. Using black frame.")
-                black_frame = torch.zeros((3, self.img_height, self.img_width), dtype=torch.float32)
-                sequence_tensors.append(black_frame)
+                seq_buf[i] = 0 # Black frame
                 if i == 0: global_flip_status = False # Ensure status is set
 
         # Post-Augmentation Coordinate Adjustment
         if global_flip_status:
             target_coords[0] = 1.0 - target_coords[0] # Flip X coordinate
 
-        # Stack tensors along a new dimension (Time/Sequence) before concatenating channels
-        # Result shape: [SeqLen, Channels, Height, Width]
+        # [SeqLen, Height, Width, Channels] uint8; zero-copy wrap of the
+        # buffer. The [C*T, H, W] reshape for Conv2D happens after the H2D
+        # transfer in batch_to_model_input.
         try:
-            # Use torch.stack for creating the sequence dimension
-            stacked_sequence = torch.stack(sequence_tensors, dim=0)
-
-            # Reshape/Permute to [Channels * SeqLen, Height, Width] for Conv2D input
-            # Target shape: [C*T, H, W]
-            num_channels, height, width = stacked_sequence.shape[1], stacked_sequence.shape[2], stacked_sequence.shape[3]
-            # Permute to [C, T, H, W] then reshape
-            final_tensor = stacked_sequence.permute(1, 0, 2, 3).reshape(num_channels * self.n_frames_sequence, height, width)
-
+            stacked_sequence = torch.from_numpy(seq_buf)
+            if self.augment and random.random() < 0.5:
+                # One grid_sample warp over all frames replaces per-frame
+                # cv2.warpPerspective calls
+                stacked_sequence = random_keystone_adjustment_batch(stacked_sequence)
             target_tensor = torch.tensor(target_coords, dtype=torch.float32)
-            return final_tensor, target_tensor
+            return stacked_sequence, target_tensor
 
         except Exception as e:
-             print(f"Error stacking/reshaping sequence {idx}: {e}. Returning zeros.")
-             dummy_seq = torch.zeros((self.n_frames_sequence * 3, self.img_height, self.img_width), dtype=torch.float32)
-             dummy_target = torch.zeros((2,), dtype=torch.float32)
-             return dummy_seq, dummy_target
+             print(f"Error stacking sequence {idx}: {e}. Returning zeros.")
+             if self._zero_seq is None:
+                 self._zero_seq = (torch.zeros((self.n_frames_sequence, self.img_height, self.img_width, 3), dtype=torch.uint8),
+                                   torch.zeros((2,), dtype=torch.float32))
+             return self._zero_seq
         
 # --- MODIFIED Dataset for Joint Training ---
 class JointPredictionDataset(Dataset):
@@ -145,6 +403,7 @@ class JointPredictionDataset(Dataset):
         self.img_width = img_width
         self.n_frames_context = n_frames_context # Length of the long sequence
         self.augment = augment
+        self._zero_tensors = None # Cached error fallback, built on first use
         if n_frames_context % 2 == 0:
              print(f"Warning: Joint dataset context length ({n_frames_context}) should be odd.")
 
@@ -165,27 +424,28 @@ class JointPredictionDataset(Dataset):
 
         long_sequence_frame_tensors = []
         global_flip_status = False
+        aug_params = sample_augmentation_params(len(frame_paths)) if self.augment else None
 
         # Process each frame in the LONG sequence
         for i, frame_path in enumerate(frame_paths):
             try:
-                img_bgr = cv2.imread(frame_path)
-                if img_bgr is None: raise IOError(f"Failed load frame: {frame_path}")
-
                 if self.augment:
+                    img_bgr = _read_bgr(frame_path)
+                    if img_bgr is None: raise IOError(f"Failed load frame: {frame_path}")
                     # Augmentations might affect CNN1 scores, apply carefully if needed
-                    # Keeping CNN2 type aug for now
-                    img_pil_augmented, was_flipped = apply_augmentations(img_bgr, cnn_type=2)
+                    # Keeping CNN2 type aug for now (keystone done batched below)
+                    img_pil_augmented, was_flipped = apply_augmentations(
+                        img_bgr, cnn_type=2, keystone=False, params=aug_params, frame_idx=i)
                     img_rgb = np.array(img_pil_augmented)
                     if i == 0: global_flip_status = was_flipped
                 else:
-                    img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
+                    img_rgb = _read_rgb(frame_path) # Direct RGB decode
+                    if img_rgb is None: raise IOError(f"Failed load frame: {frame_path}")
 
-                # Common processing
-                img_resized = cv2.resize(img_rgb, (self.img_width, self.img_height), interpolation=cv2.INTER_LINEAR)
-                img_normalized = (img_resized / 255.0).astype(np.float32)
-                img_transposed = np.transpose(img_normalized, (2, 0, 1)) # CHW
-                long_sequence_frame_tensors.append(torch.from_numpy(img_transposed))
+                # Resize only; uint8 HWC ships to the GPU where the
+                # normalize/transpose happen in the joint training loop
+                img_resized = cv2.resize(img_rgb, (self.img_width, self.img_height), interpolation=cv2.INTER_AREA)
+                long_sequence_frame_tensors.append(torch.from_numpy(img_resized))
 
             except Exception as e:
                 print(f"Error processing frame {frame_path} in long joint sequence {idx}: {e}. Returning zeros.")
@@ -196,8 +456,10 @@ class JointPredictionDataset(Dataset):
             target_coords[0] = 1.0 - target_coords[0]
 
         try:
-            # Stack frames for CNN1 input: [ContextLen, C, H, W]
+            # Stack frames: [ContextLen, H, W, C] uint8
             long_seq_tensor = torch.stack(long_sequence_frame_tensors, dim=0)
+            if self.augment and random.random() < 0.5:
+                long_seq_tensor = random_keystone_adjustment_batch(long_seq_tensor)
 
             # Prepare target tensors
             target_coords_tensor = torch.tensor(target_coords, dtype=torch.float32)
@@ -205,7 +467,7 @@ class JointPredictionDataset(Dataset):
             true_hit_index_tensor = torch.tensor(true_hit_index, dtype=torch.long)
 
             # Returns:
-            # 1. Long sequence tensor [ContextLen, C, H, W]
+            # 1. Long sequence tensor [ContextLen, H, W, C] uint8
             # 2. Target h(x) weights for the long sequence [ContextLen]
             # 3. Target landing coordinates [2]
             # 4. Index of true hit frame within the long sequence [1]
@@ -216,9 +478,12 @@ class JointPredictionDataset(Dataset):
              return self._get_zero_tensors()
 
     def _get_zero_tensors(self):
-        """Helper to return zero tensors on error."""
-        dummy_seq = torch.zeros((self.n_frames_context, 3, self.img_height, self.img_width), dtype=torch.float32)
-        dummy_weights = torch.zeros((self.n_frames_context,), dtype=torch.float32)
-        dummy_coords = torch.zeros((2,), dtype=torch.float32)
-        dummy_index = torch.tensor(0, dtype=torch.long)
-        return dummy_seq, dummy_weights, dummy_coords, dummy_index
\ No newline at end of file
+        """Helper to return zero tensors on error (cached after first use)."""
+        if self._zero_tensors is None:
+            self._zero_tensors = (
+                torch.zeros((self.n_frames_context, self.img_height, self.img_width, 3), dtype=torch.uint8),
+                torch.zeros((self.n_frames_context,), dtype=torch.float32),
+                torch.zeros((2,), dtype=torch.float32),
+                torch.tensor(0, dtype=torch.long),
+            )
+        return self._zero_tensors
\ No newline at end of file
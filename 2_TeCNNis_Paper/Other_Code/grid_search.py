@@ -5,7 +5,6 @@ import random
 import gc
 import torch
 import torch.nn as nn
-import torch.optim as optim
 from torch.utils.data import DataLoader
 import pandas as pd
 import json
@@ -14,8 +13,8 @@ import math
 # Import project modules
 import config
 from models import HitFrameRegressorParam, HitFrameRegressorFinal, LandingPointCNNParam, LandingPointCNN
-from datasets import TennisFrameDataset, BallLandingDataset
-from training import train_model
+from datasets import TennisFrameDataset, BallLandingDataset, limit_worker_threads
+from training import train_model, make_adam
 from data_utils import apply_linear_weighting_to_df, balance_and_split_data, get_sequences_for_cnn2, split_sequences
 
 def run_cnn1_arch_search(df_full, initial_splits, device):
@@ -47,8 +46,8 @@ def run_cnn1_arch_search(df_full, initial_splits, device):
     temp_train_ds = TennisFrameDataset(train_p, train_t, config.IMG_HEIGHT, config.IMG_WIDTH, augment=False)
     temp_val_ds = TennisFrameDataset(val_p, val_t, config.IMG_HEIGHT, config.IMG_WIDTH, augment=False)
     # Use default BS/LR from config for this specific search
-    temp_train_loader = DataLoader(temp_train_ds, batch_size=config.DEFAULT_CNN1_BATCH_SIZE, shuffle=True, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY)
-    temp_val_loader = DataLoader(temp_val_ds, batch_size=config.DEFAULT_CNN1_BATCH_SIZE, shuffle=False, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY)
+    temp_train_loader = DataLoader(temp_train_ds, batch_size=config.DEFAULT_CNN1_BATCH_SIZE, shuffle=True, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, persistent_workers=config.PERSISTENT_WORKERS, prefetch_factor=config.PREFETCH_FACTOR, worker_init_fn=limit_worker_threads)
+    temp_val_loader = DataLoader(temp_val_ds, batch_size=config.DEFAULT_CNN1_BATCH_SIZE, shuffle=False, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, persistent_workers=config.PERSISTENT_WORKERS, prefetch_factor=config.PREFETCH_FACTOR, worker_init_fn=limit_worker_threads)
     temp_criterion = nn.MSELoss()
     temp_lr = config.DEFAULT_CNN1_LR
 
@@ -64,7 +63,7 @@ def run_cnn1_arch_search(df_full, initial_splits, device):
             model = HitFrameRegressorParam(
                 block_filters=filters, fc_size=fc_size, dropout_rate=dropout
             ).to(device)
-            optimizer = optim.Adam(model.parameters(), lr=temp_lr)
+            optimizer = make_adam(model.parameters(), lr=temp_lr)
 
             val_loss = train_model(
                 model=model, model_name="CNN1 (Arch Tuning)", train_loader=temp_train_loader, val_loader=temp_val_loader,
@@ -150,12 +149,12 @@ def run_cnn1_dataprep_search(df_full, best_arch_params, device):
             # 2. Create DataLoaders
             train_ds = TennisFrameDataset(train_p, train_t, config.IMG_HEIGHT, config.IMG_WIDTH, augment=False)
             val_ds = TennisFrameDataset(val_p, val_t, config.IMG_HEIGHT, config.IMG_WIDTH, augment=False)
-            train_loader = DataLoader(train_ds, batch_size=temp_bs, shuffle=True, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY)
-            val_loader = DataLoader(val_ds, batch_size=temp_bs, shuffle=False, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY)
+            train_loader = DataLoader(train_ds, batch_size=temp_bs, shuffle=True, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, persistent_workers=config.PERSISTENT_WORKERS, prefetch_factor=config.PREFETCH_FACTOR, worker_init_fn=limit_worker_threads)
+            val_loader = DataLoader(val_ds, batch_size=temp_bs, shuffle=False, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, persistent_workers=config.PERSISTENT_WORKERS, prefetch_factor=config.PREFETCH_FACTOR, worker_init_fn=limit_worker_threads)
 
             # 3. Instantiate Model with best arch
             model = HitFrameRegressorFinal(block_filters=filters, fc_size=fc_size, dropout_rate=dropout).to(device)
-            optimizer = optim.Adam(model.parameters(), lr=temp_lr)
+            optimizer = make_adam(model.parameters(), lr=temp_lr)
 
             # 4. Train briefly
             val_loss = train_model(
@@ -242,14 +241,14 @@ def run_cnn1_trainhp_search(final_cnn1_splits, best_arch_params, device):
 
         try:
             # Create DataLoaders with current batch size
-            train_loader = DataLoader(train_ds, batch_size=batch_size, shuffle=True, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, drop_last=True)
-            val_loader = DataLoader(val_ds, batch_size=batch_size, shuffle=False, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY)
+            train_loader = DataLoader(train_ds, batch_size=batch_size, shuffle=True, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, persistent_workers=config.PERSISTENT_WORKERS, prefetch_factor=config.PREFETCH_FACTOR, worker_init_fn=limit_worker_threads, drop_last=True)
+            val_loader = DataLoader(val_ds, batch_size=batch_size, shuffle=False, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, persistent_workers=config.PERSISTENT_WORKERS, prefetch_factor=config.PREFETCH_FACTOR, worker_init_fn=limit_worker_threads)
             if len(train_loader) == 0 or len(val_loader) == 0:
                  print(f"WARN: DataLoader empty for BS={batch_size}. Skipping.")
                  continue
 
             model = HitFrameRegressorFinal(block_filters=filters, fc_size=fc_size, dropout_rate=dropout).to(device)
-            optimizer = optim.Adam(model.parameters(), lr=lr)
+            optimizer = make_adam(model.parameters(), lr=lr)
 
             val_loss = train_model(
                 model=model, model_name="CNN1 (TrainHP Tuning)", train_loader=train_loader, val_loader=val_loader,
@@ -328,12 +327,12 @@ def run_cnn2_dataprep_search(cnn1_balanced_df, landing_df, device):
             # 2. Create DataLoaders
             train_ds = BallLandingDataset(train_seq, config.IMG_HEIGHT, config.IMG_WIDTH, seq_len, augment=False)
             val_ds = BallLandingDataset(val_seq, config.IMG_HEIGHT, config.IMG_WIDTH, seq_len, augment=False)
-            train_loader = DataLoader(train_ds, batch_size=temp_bs, shuffle=True, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY)
-            val_loader = DataLoader(val_ds, batch_size=temp_bs, shuffle=False, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY)
+            train_loader = DataLoader(train_ds, batch_size=temp_bs, shuffle=True, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, persistent_workers=config.PERSISTENT_WORKERS, prefetch_factor=config.PREFETCH_FACTOR, worker_init_fn=limit_worker_threads)
+            val_loader = DataLoader(val_ds, batch_size=temp_bs, shuffle=False, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, persistent_workers=config.PERSISTENT_WORKERS, prefetch_factor=config.PREFETCH_FACTOR, worker_init_fn=limit_worker_threads)
 
             # 3. Instantiate CNN2 Model
             model = LandingPointCNN(input_channels=current_input_channels).to(device)
-            optimizer = optim.Adam(model.parameters(), lr=temp_lr)
+            optimizer = make_adam(model.parameters(), lr=temp_lr)
 
             # 4. Train briefly
             val_loss = train_model(
@@ -411,14 +410,14 @@ def run_cnn2_trainhp_search(final_cnn2_splits, best_seq_len, device):
         gc.collect(); torch.cuda.empty_cache()
 
         try:
-            train_loader = DataLoader(train_ds, batch_size=batch_size, shuffle=True, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, drop_last=True)
-            val_loader = DataLoader(val_ds, batch_size=batch_size, shuffle=False, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY)
+            train_loader = DataLoader(train_ds, batch_size=batch_size, shuffle=True, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, persistent_workers=config.PERSISTENT_WORKERS, prefetch_factor=config.PREFETCH_FACTOR, worker_init_fn=limit_worker_threads, drop_last=True)
+            val_loader = DataLoader(val_ds, batch_size=batch_size, shuffle=False, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, persistent_workers=config.PERSISTENT_WORKERS, prefetch_factor=config.PREFETCH_FACTOR, worker_init_fn=limit_worker_threads)
             if len(train_loader) == 0 or len(val_loader) == 0:
                  print(f"WARN: DataLoader empty for BS={batch_size}. Skipping.")
                  continue
 
             model = LandingPointCNN(input_channels=input_channels).to(device)
-            optimizer = optim.Adam(model.parameters(), lr=lr)
+            optimizer = make_adam(model.parameters(), lr=lr)
 
             val_loss = train_model(
                 model=model, model_name="CNN2 (TrainHP Tuning)", train_loader=train_loader, val_loader=val_loader,
@@ -520,11 +519,11 @@ def run_cnn2_arch_search(standard_cnn2_splits, standard_cnn2_seq_len, device):
             ).to(device)
 
             # Create DataLoaders (batch size fixed for arch search for now)
-            train_loader = DataLoader(train_ds, batch_size=temp_bs, shuffle=True, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, drop_last=True)
-            val_loader = DataLoader(val_ds, batch_size=temp_bs, shuffle=False, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY)
+            train_loader = DataLoader(train_ds, batch_size=temp_bs, shuffle=True, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, persistent_workers=config.PERSISTENT_WORKERS, prefetch_factor=config.PREFETCH_FACTOR, worker_init_fn=limit_worker_threads, drop_last=True)
+            val_loader = DataLoader(val_ds, batch_size=temp_bs, shuffle=False, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, persistent_workers=config.PERSISTENT_WORKERS, prefetch_factor=config.PREFETCH_FACTOR, worker_init_fn=limit_worker_threads)
             if len(train_loader) == 0 or len(val_loader) == 0: continue # Skip if BS too large
 
-            optimizer = optim.Adam(model.parameters(), lr=temp_lr)
+            optimizer = make_adam(model.parameters(), lr=temp_lr)
 
             val_loss = train_model(
                 model=model, model_name="CNN2 (Arch Tuning)", train_loader=train_loader, val_loader=val_loader,
@@ -4,16 +4,15 @@ import warnings
 import gc
 import torch
 import torch.nn as nn
-import torch.optim as optim
 from torch.utils.data import DataLoader
 import argparse # For command-line arguments
 import time
 import random
 import numpy as np
-import matplotlib.pyplot as plt
+import pandas as pd
 import cv2
 import math # For checking float validity
-import re # Added for fallback dir finding
+import functools # For binding collate_fn arguments
 import json # Added for saving/loading json directly if needed
 
 # Suppress specific warnings
@@ -27,11 +26,13 @@ from data_utils import (load_metadata, apply_linear_weighting_to_df, # Use linea
                         apply_bayesian_weighting_to_df, # Use bayesian
                         balance_and_split_data, load_landing_data,
                         get_sequences_for_cnn2, get_long_context_sequences, # Use long context
-                        split_sequences)
+                        split_sequences, preprocessing_cache_path, # Cache helpers
+                        load_cached_pickle, save_cached_pickle, preresize_frames)
 # Add LandingPointCNNParam to imports if needed by grid_search
-from datasets import TennisFrameDataset, BallLandingDataset, JointPredictionDataset # Add Joint
-from models import (HitFrameRegressorFinal, LandingPointCNN, LandingPointCNNParam) # Add CNN2 Param
-from training import train_model, evaluate_model, train_joint_model # Add Joint
+from datasets import (TennisFrameDataset, BallLandingDataset, JointPredictionDataset,
+                      limit_worker_threads, gpu_decode_available, gpu_decode_collate) # Add Joint
+from models import (HitFrameRegressorFinal, LandingPointCNN, LandingPointCNNParam, prepare_model) # Add CNN2 Param
+from training import train_model, evaluate_model, train_joint_model, make_adam # Add Joint
 # Add run_cnn2_arch_search to grid_search imports
 from grid_search import (run_cnn1_arch_search, run_cnn1_trainhp_search,
                          run_cnn2_dataprep_search, run_cnn2_trainhp_search, run_cnn2_arch_search) # Add CNN2 arch search
@@ -40,6 +41,11 @@ from bayesian_optimizer import run_bayesian_optimization # NEW Import
 from prediction import (load_final_cnn1_model, load_final_cnn2_model,
                         predict_hit_and_landing, denormalize_coordinates) # Updated prediction
 
+# cv2 in the main process only does light prediction/viz work; cap its
+# thread pool so it does not contend with the DataLoader workers (which
+# pin their own pools via limit_worker_threads)
+cv2.setNumThreads(0)
+
 # Set seed for reproducibility (optional)
 SEED = 42
 random.seed(SEED)
@@ -94,6 +100,11 @@ def main(args):
          print("Error: Cannot proceed with optimization/training without a valid dataset path.")
          return
 
+    # --- Optional one-time pre-resize of all frames to model resolution ---
+    if args.preresize_frames and df_full is not None:
+        preresize_frames(df_full, dataset_base_path)
+        df_full = load_metadata(csv_path, dataset_base_path) # Re-point paths at the mirror
+
 
     # --- 3. Initialize Hyperparameters ---
     cnn1_weighting_params = None # For h(x) params (R1, R2, N, D, M1, M2)
@@ -334,11 +345,31 @@ def main(args):
 
         # Regenerate CNN1 data splits using LINEAR weights for standard training/eval
         print("Applying LINEAR weights for Standard CNN1 data...")
+        # Weighting/balancing is deterministic given SEED + hyperparams, so
+        # cache the results keyed by a config hash and skip recomputation.
+        linear_weight_cfg = {'seed': SEED, 'base': dataset_base_path,
+                             'window': config.DEFAULT_LINEAR_N_FRAMES_WEIGHTING,
+                             'decay': config.DEFAULT_LINEAR_WEIGHT_DECAY}
         if df_processed_linear is None: # Create if not done during searches
-             df_processed_linear = apply_linear_weighting_to_df(
-                 df_full, config.DEFAULT_LINEAR_N_FRAMES_WEIGHTING, config.DEFAULT_LINEAR_WEIGHT_DECAY
-             )
-        final_cnn1_splits = balance_and_split_data(df_processed_linear, config.DEFAULT_BALANCE_RATIO)
+             weighted_cache = preprocessing_cache_path('weighted_linear', linear_weight_cfg, 'parquet')
+             if os.path.exists(weighted_cache):
+                 print(f"Loading cached weighted metadata: {weighted_cache}")
+                 try:
+                     df_processed_linear = pd.read_parquet(weighted_cache)
+                 except Exception as e:
+                     print(f"Warning: Could not read cache {weighted_cache}: {e}. Recomputing.")
+             if df_processed_linear is None:
+                 df_processed_linear = apply_linear_weighting_to_df(
+                     df_full, config.DEFAULT_LINEAR_N_FRAMES_WEIGHTING, config.DEFAULT_LINEAR_WEIGHT_DECAY
+                 )
+                 try: df_processed_linear.to_parquet(weighted_cache)
+                 except Exception as e: print(f"Warning: Could not write cache {weighted_cache}: {e}")
+        splits_cache = preprocessing_cache_path(
+            'cnn1_splits', dict(linear_weight_cfg, ratio=config.DEFAULT_BALANCE_RATIO), 'pkl')
+        final_cnn1_splits = load_cached_pickle(splits_cache)
+        if final_cnn1_splits is None:
+            final_cnn1_splits = balance_and_split_data(df_processed_linear, config.DEFAULT_BALANCE_RATIO)
+            save_cached_pickle(splits_cache, final_cnn1_splits)
         cnn1_balanced_df_linear = final_cnn1_splits[0] # Store balanced df from linear weights
         _, f_train_p1, f_train_t1, f_val_p1, f_val_t1, f_test_p1, f_test_t1 = final_cnn1_splits
         if not f_train_p1 or not f_val_p1 or not f_test_p1: print("ERROR: Final std CNN1 split failed."); return
@@ -361,9 +392,16 @@ def main(args):
             print(f"Preparing Standard CNN2 sequences for Val/Test using length: {val_test_cnn2_seq_len}")
 
             # Create sequences using this length - needed for val/test sets
-            final_sequences_cnn2_val_test = get_sequences_for_cnn2(
-                cnn1_balanced_df_linear, landing_df_indexed, val_test_cnn2_seq_len
-            )
+            seq_cache_vt = preprocessing_cache_path(
+                'cnn2_sequences',
+                dict(linear_weight_cfg, ratio=config.DEFAULT_BALANCE_RATIO, seq_len=val_test_cnn2_seq_len),
+                'pkl')
+            final_sequences_cnn2_val_test = load_cached_pickle(seq_cache_vt)
+            if final_sequences_cnn2_val_test is None:
+                final_sequences_cnn2_val_test = get_sequences_for_cnn2(
+                    cnn1_balanced_df_linear, landing_df_indexed, val_test_cnn2_seq_len
+                )
+                save_cached_pickle(seq_cache_vt, final_sequences_cnn2_val_test)
             if not final_sequences_cnn2_val_test: raise ValueError("No std CNN2 sequences for val/test.")
             # We need to split the *entire* set prepared with this length
             _, f_val_seq2, f_test_seq2 = split_sequences(final_sequences_cnn2_val_test) # Only need val/test splits here
@@ -372,9 +410,16 @@ def main(args):
             f_train_seq2 = None
             if args.run_final_training:
                  print(f"Preparing Standard CNN2 sequences for Train using length: {cnn2_seq_len_std}")
-                 final_sequences_cnn2_train = get_sequences_for_cnn2(
-                      cnn1_balanced_df_linear, landing_df_indexed, cnn2_seq_len_std
-                 )
+                 seq_cache_tr = preprocessing_cache_path(
+                     'cnn2_sequences',
+                     dict(linear_weight_cfg, ratio=config.DEFAULT_BALANCE_RATIO, seq_len=cnn2_seq_len_std),
+                     'pkl')
+                 final_sequences_cnn2_train = load_cached_pickle(seq_cache_tr)
+                 if final_sequences_cnn2_train is None:
+                     final_sequences_cnn2_train = get_sequences_for_cnn2(
+                          cnn1_balanced_df_linear, landing_df_indexed, cnn2_seq_len_std
+                     )
+                     save_cached_pickle(seq_cache_tr, final_sequences_cnn2_train)
                  if not final_sequences_cnn2_train: raise ValueError("No std CNN2 sequences for train.")
                  f_train_seq2, _, _ = split_sequences(final_sequences_cnn2_train) # Only need train split here
 
@@ -412,25 +457,35 @@ def main(args):
         # --- Create Final DataLoaders ---
         print("\nCreating final DataLoaders...")
         # Standard CNN1 Loaders
-        if f_train_p1: cnn1_train_loader = DataLoader(TennisFrameDataset(f_train_p1, f_train_t1, augment=True), batch_size=cnn1_trainhp_params['batch_size'], shuffle=True, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, drop_last=True)
-        if f_val_p1: cnn1_val_loader = DataLoader(TennisFrameDataset(f_val_p1, f_val_t1, augment=False), batch_size=cnn1_trainhp_params['batch_size'], shuffle=False, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY)
-        if f_test_p1: cnn1_test_loader = DataLoader(TennisFrameDataset(f_test_p1, f_test_t1, augment=False), batch_size=cnn1_trainhp_params['batch_size'], shuffle=False, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY)
+        if f_train_p1: cnn1_train_loader = DataLoader(TennisFrameDataset(f_train_p1, f_train_t1, augment=True), batch_size=cnn1_trainhp_params['batch_size'], shuffle=True, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, persistent_workers=config.PERSISTENT_WORKERS, prefetch_factor=config.PREFETCH_FACTOR, worker_init_fn=limit_worker_threads, drop_last=True)
+        # Non-augmenting CNN1 loaders decode whole batches via NVJPEG when
+        # available; the collate yields CUDA tensors, so those loaders run
+        # in-process (the per-item work left on the CPU is just a byte read)
+        cnn1_gpu_decode = gpu_decode_available()
+        if cnn1_gpu_decode:
+            print("Using GPU JPEG decode for CNN1 val/test loaders.")
+            cnn1_eval_kwargs = dict(num_workers=0, pin_memory=False,
+                                    collate_fn=functools.partial(gpu_decode_collate, device=config.DEVICE))
+        else:
+            cnn1_eval_kwargs = dict(num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, persistent_workers=config.PERSISTENT_WORKERS, prefetch_factor=config.PREFETCH_FACTOR, worker_init_fn=limit_worker_threads)
+        if f_val_p1: cnn1_val_loader = DataLoader(TennisFrameDataset(f_val_p1, f_val_t1, augment=False, decode_on_gpu=cnn1_gpu_decode), batch_size=cnn1_trainhp_params['batch_size'], shuffle=False, **cnn1_eval_kwargs)
+        if f_test_p1: cnn1_test_loader = DataLoader(TennisFrameDataset(f_test_p1, f_test_t1, augment=False, decode_on_gpu=cnn1_gpu_decode), batch_size=cnn1_trainhp_params['batch_size'], shuffle=False, **cnn1_eval_kwargs)
         print(f"Std CNN1 Loaders: Tr={len(cnn1_train_loader or [])}, Vl={len(cnn1_val_loader or [])}, Ts={len(cnn1_test_loader or [])}")
 
         # Standard CNN2 Loaders (use specific lengths)
         if final_cnn2_splits:
             f_train_seq2, f_val_seq2, f_test_seq2 = final_cnn2_splits
             # Std train loader uses standard odd length
-            if args.run_final_training and f_train_seq2: cnn2_train_loader = DataLoader(BallLandingDataset(f_train_seq2, n_frames_sequence=cnn2_seq_len_std, augment=True), batch_size=cnn2_trainhp_params['batch_size'], shuffle=True, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, drop_last=True)
+            if args.run_final_training and f_train_seq2: cnn2_train_loader = DataLoader(BallLandingDataset(f_train_seq2, n_frames_sequence=cnn2_seq_len_std, augment=True), batch_size=cnn2_trainhp_params['batch_size'], shuffle=True, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, persistent_workers=config.PERSISTENT_WORKERS, prefetch_factor=config.PREFETCH_FACTOR, worker_init_fn=limit_worker_threads, drop_last=True)
             # Val/Test loaders use val_test_cnn2_seq_len (which might be dynamic if joint training)
-            if f_val_seq2: cnn2_val_loader = DataLoader(BallLandingDataset(f_val_seq2, n_frames_sequence=val_test_cnn2_seq_len, augment=False), batch_size=cnn2_trainhp_params['batch_size'], shuffle=False, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY)
-            if f_test_seq2: cnn2_test_loader = DataLoader(BallLandingDataset(f_test_seq2, n_frames_sequence=val_test_cnn2_seq_len, augment=False), batch_size=cnn2_trainhp_params['batch_size'], shuffle=False, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY)
+            if f_val_seq2: cnn2_val_loader = DataLoader(BallLandingDataset(f_val_seq2, n_frames_sequence=val_test_cnn2_seq_len, augment=False), batch_size=cnn2_trainhp_params['batch_size'], shuffle=False, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, persistent_workers=config.PERSISTENT_WORKERS, prefetch_factor=config.PREFETCH_FACTOR, worker_init_fn=limit_worker_threads)
+            if f_test_seq2: cnn2_test_loader = DataLoader(BallLandingDataset(f_test_seq2, n_frames_sequence=val_test_cnn2_seq_len, augment=False), batch_size=cnn2_trainhp_params['batch_size'], shuffle=False, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, persistent_workers=config.PERSISTENT_WORKERS, prefetch_factor=config.PREFETCH_FACTOR, worker_init_fn=limit_worker_threads)
             print(f"Std CNN2 Loaders: Tr={len(cnn2_train_loader or [])} (len={cnn2_seq_len_std}), Vl={len(cnn2_val_loader or [])} (len={val_test_cnn2_seq_len}), Ts={len(cnn2_test_loader or [])} (len={val_test_cnn2_seq_len})")
 
         # Joint Training Loaders
         if args.run_joint_training and final_joint_splits:
              f_train_seqJ = final_joint_splits[0]
-             joint_train_loader = DataLoader(JointPredictionDataset(f_train_seqJ, n_frames_context=config.JOINT_DATASET_CONTEXT_FRAMES, augment=True), batch_size=config.DEFAULT_JOINT_BATCH_SIZE, shuffle=True, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, drop_last=True)
+             joint_train_loader = DataLoader(JointPredictionDataset(f_train_seqJ, n_frames_context=config.JOINT_DATASET_CONTEXT_FRAMES, augment=True), batch_size=config.DEFAULT_JOINT_BATCH_SIZE, shuffle=True, num_workers=config.NUM_WORKERS, pin_memory=config.PIN_MEMORY, persistent_workers=config.PERSISTENT_WORKERS, prefetch_factor=config.PREFETCH_FACTOR, worker_init_fn=limit_worker_threads, drop_last=True)
              # Assign the (now correctly sized) cnn2_val_loader for joint validation
              joint_val_loader = cnn2_val_loader
              joint_test_loader = cnn2_test_loader # Use std test loader
@@ -450,8 +505,8 @@ def main(args):
              'fc_size': cnn1_arch_params['fc_size'],
              'dropout_rate': cnn1_arch_params.get('dropout', cnn1_arch_params.get('dropout_rate', config.DEFAULT_CNN1_DROPOUT))
          }
-         cnn1_model_std = HitFrameRegressorFinal(**cnn1_init_params_std).to(config.DEVICE)
-         criterion1 = nn.MSELoss(); optimizer1 = optim.Adam(cnn1_model_std.parameters(), lr=cnn1_trainhp_params['learning_rate'])
+         cnn1_model_std = prepare_model(HitFrameRegressorFinal(**cnn1_init_params_std).to(config.DEVICE))
+         criterion1 = nn.MSELoss(); optimizer1 = make_adam(cnn1_model_std.parameters(), lr=cnn1_trainhp_params['learning_rate'])
          model1_path = os.path.join(config.PROJECT_OUTPUT_PATH, 'cnn1_hit_frame_regressor_final.pth')
          history1_path = os.path.join(config.PROJECT_OUTPUT_PATH, 'cnn1_final_training_history.csv')
          train_model(model=cnn1_model_std, model_name="CNN1 Final", train_loader=cnn1_train_loader, val_loader=cnn1_val_loader, criterion=criterion1, optimizer=optimizer1, device=config.DEVICE, epochs=config.DEFAULT_FINAL_EPOCHS, early_stopping_patience=config.DEFAULT_EARLY_STOPPING_PATIENCE, min_improvement=config.DEFAULT_MIN_IMPROVEMENT, results_save_path=history1_path, best_model_save_path=model1_path)
@@ -473,8 +528,8 @@ def main(args):
              'fc_sizes': tuple(cnn2_arch_params['fc_sizes']),
              'dropout_rate': cnn2_arch_params.get('dropout', config.DEFAULT_CNN2_DROPOUT)
          }
-         cnn2_model_std = LandingPointCNN(**cnn2_init_params_std).to(config.DEVICE)
-         criterion2 = nn.MSELoss(); optimizer2 = optim.Adam(cnn2_model_std.parameters(), lr=cnn2_trainhp_params['learning_rate'])
+         cnn2_model_std = prepare_model(LandingPointCNN(**cnn2_init_params_std).to(config.DEVICE))
+         criterion2 = nn.MSELoss(); optimizer2 = make_adam(cnn2_model_std.parameters(), lr=cnn2_trainhp_params['learning_rate'])
          model2_path = os.path.join(config.PROJECT_OUTPUT_PATH, 'cnn2_landing_spot_predictor_final.pth')
          history2_path = os.path.join(config.PROJECT_OUTPUT_PATH, 'cnn2_final_training_history.csv')
          # Use standard cnn2_train_loader and cnn2_val_loader
@@ -502,7 +557,7 @@ def main(args):
              'fc_size': cnn1_arch_params['fc_size'],
              'dropout_rate': cnn1_arch_params.get('dropout', cnn1_arch_params.get('dropout_rate', config.DEFAULT_CNN1_DROPOUT))
          }
-         cnn1_model_joint = HitFrameRegressorFinal(**cnn1_init_params).to(config.DEVICE)
+         cnn1_model_joint = prepare_model(HitFrameRegressorFinal(**cnn1_init_params).to(config.DEVICE))
 
          # Instantiate Joint CNN2 (use dynamic length and best CNN2 arch)
          dynamic_cnn2_seq_len = config.OPTIMIZED_R1_INT + config.OPTIMIZED_R2_INT + 1
@@ -516,11 +571,11 @@ def main(args):
              'fc_sizes': tuple(cnn2_arch_params['fc_sizes']),
              'dropout_rate': cnn2_arch_params.get('dropout', config.DEFAULT_CNN2_DROPOUT)
          }
-         cnn2_model_joint = LandingPointCNN(**cnn2_init_params_joint).to(config.DEVICE)
+         cnn2_model_joint = prepare_model(LandingPointCNN(**cnn2_init_params_joint).to(config.DEVICE))
 
          # Combined optimizer
          combined_params = list(cnn1_model_joint.parameters()) + list(cnn2_model_joint.parameters())
-         optimizer_joint = optim.Adam(combined_params, lr=config.DEFAULT_JOINT_LR)
+         optimizer_joint = make_adam(combined_params, lr=config.DEFAULT_JOINT_LR)
          # Paths
          model1_joint_path = os.path.join(config.PROJECT_OUTPUT_PATH, 'cnn1_hit_frame_regressor_joint.pth')
          model2_joint_path = os.path.join(config.PROJECT_OUTPUT_PATH, 'cnn2_landing_spot_predictor_joint.pth')
@@ -553,7 +608,7 @@ def main(args):
          if cnn1_test_loader is None: print("WARN: Std CNN1 Test loader not available for evaluation.")
          else:
              cnn1_model_eval = load_final_cnn1_model(model1_path, config.DEVICE, cnn1_arch_params)
-             if cnn1_model_eval:
+             if cnn1_model_eval is not None: # bool() on a compiled module raises
                  evaluate_model(cnn1_model_eval, "CNN1 Final", cnn1_test_loader, nn.MSELoss(), config.DEVICE)
                  del cnn1_model_eval; gc.collect(); torch.cuda.empty_cache()
 
@@ -638,33 +693,17 @@ def main(args):
 
         # Load models
         cnn1_pred_model = load_final_cnn1_model(model1_pred_path, config.DEVICE, cnn1_arch_params)
-        # Instantiate CNN2 with correct arch before loading state_dict
+        # Loader handles arch instantiation plus the inference prep
+        # (mmap load, BN fusion, fp16 on GPU, compile)
         if 'conv_filters' not in cnn2_arch_params or 'fc_sizes' not in cnn2_arch_params:
              print("ERR: Cannot run prediction without CNN2 arch params.")
              cnn2_pred_model = None
         else:
-             cnn2_init_params_pred = {
-                 'input_channels': pred_cnn2_input_channels,
-                 'conv_filters': tuple(cnn2_arch_params['conv_filters']),
-                 'fc_sizes': tuple(cnn2_arch_params['fc_sizes']),
-                 'dropout_rate': cnn2_arch_params.get('dropout', config.DEFAULT_CNN2_DROPOUT)
-             }
-             cnn2_pred_model_instance = LandingPointCNN(**cnn2_init_params_pred).to(config.DEVICE)
-             cnn2_pred_model = None # Reset
-             if os.path.exists(model2_pred_path):
-                 try:
-                      # Use the utility function which just loads state dict now
-                      # We need to ensure load_final_cnn2_model can handle this or load directly
-                      state_dict = torch.load(model2_pred_path, map_location=config.DEVICE)
-                      cnn2_pred_model_instance.load_state_dict(state_dict)
-                      cnn2_pred_model_instance.eval()
-                      print(f"Loaded prediction CNN2 weights from {os.path.basename(model2_pred_path)}")
-                      cnn2_pred_model = cnn2_pred_model_instance # Use the loaded instance
-                 except Exception as e: print(f"ERROR loading prediction CNN2 weights: {e}")
-             else: print(f"Prediction CNN2 model file not found: {model2_pred_path}")
-
-
-        if not cnn1_pred_model or not cnn2_pred_model:
+             cnn2_pred_model = load_final_cnn2_model(model2_pred_path, config.DEVICE,
+                                                     pred_cnn2_input_channels, cnn2_arch_params)
+
+
+        if cnn1_pred_model is None or cnn2_pred_model is None: # bool() on a compiled module raises
             print("Error: One or both models not loaded for prediction.")
         else:
             # Find example directory
@@ -689,9 +728,18 @@ def main(args):
             if not example_dir and dataset_base_path:
                  frames_root = os.path.join(dataset_base_path, 'Frames')
                  try:
-                      potential_dirs = [os.path.join(dp, d) for dp, dn, fn in os.walk(frames_root) for d in dn if re.match(r'^(ICT|IST|OCT|OST)\d+$', d)]
-                      if potential_dirs:
-                           example_dir = random.choice(potential_dirs)
+                      # One-level scandir instead of os.walk: the shot dirs sit
+                      # directly under Frames/, and walk would stat every frame.
+                      # Reservoir sampling (k=1) picks a uniform random dir in
+                      # the same pass without materializing the list.
+                      prefixes = ('ICT', 'IST', 'OCT', 'OST')
+                      n_dirs = 0
+                      for entry in os.scandir(frames_root):
+                           if entry.is_dir() and entry.name.startswith(prefixes) and entry.name[3:].isdigit():
+                                n_dirs += 1
+                                if random.random() < 1.0 / n_dirs:
+                                     example_dir = entry.path
+                      if example_dir:
                            print(f"Using fallback example directory: {os.path.basename(example_dir)}")
                  except Exception as e: print(f"Error finding fallback directory: {e}")
 
@@ -716,38 +764,37 @@ def main(args):
                     if dl is not None: print(f"Predicted Landing (Approx. Meters): L={dl:.2f}m, R={dr:.2f}m, Baseline={db:.2f}m")
 
                     if actual_coords_example:
-                        err_x = abs(predicted_coords[0] - actual_coords_example[0])
-                        err_y = abs(predicted_coords[1] - actual_coords_example[1])
-                        euc_dist_norm = np.sqrt(err_x**2 + err_y**2)
+                        # math.hypot: one C call, no NumPy scalar dispatch
+                        euc_dist_norm = math.hypot(predicted_coords[0] - actual_coords_example[0],
+                                                   predicted_coords[1] - actual_coords_example[1])
                         print(f"Normalized Euclidean Error vs Actual: {euc_dist_norm:.4f}")
 
-                    # Visualize
+                    # Visualize: cv2-native annotation straight to disk. A
+                    # matplotlib Figure here costs tens of ms per call and
+                    # leaks RSS when predicting in a loop; drawing two
+                    # circles and one imwrite is headless-safe and ~free.
                     try:
                         img_hit = cv2.imread(predicted_hit_path)
                         if img_hit is not None:
-                             img_rgb = cv2.cvtColor(img_hit, cv2.COLOR_BGR2RGB)
-                             h, w, _ = img_rgb.shape
+                             h, w, _ = img_hit.shape
                              marker_x = int(predicted_coords[0] * w)
                              marker_y = int((1.0 - predicted_coords[1]) * h) # Y=0 baseline -> Image Y=0 top
-
-                             plt.figure(figsize=(7, 6))
-                             plt.imshow(img_rgb)
-                             plt.plot(marker_x, marker_y, 'ro', markersize=10, alpha=0.8, label=f'Pred ({predicted_coords[0]:.2f},{predicted_coords[1]:.2f})')
+                             cv2.circle(img_hit, (marker_x, marker_y), 8, (0, 0, 255), -1) # Pred: red (BGR)
 
                              if actual_coords_example:
                                  actual_marker_x = int(actual_coords_example[0] * w)
                                  actual_marker_y = int((1.0 - actual_coords_example[1]) * h)
-                                 plt.plot(actual_marker_x, actual_marker_y, 'go', markersize=10, alpha=0.6, label=f'Actual ({actual_coords_example[0]:.2f},{actual_coords_example[1]:.2f})')
+                                 cv2.circle(img_hit, (actual_marker_x, actual_marker_y), 8, (0, 255, 0), -1) # Actual: green
+
+                             cv2.putText(img_hit, f"Pred ({predicted_coords[0]:.2f},{predicted_coords[1]:.2f})",
+                                         (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+                             if actual_coords_example:
+                                 cv2.putText(img_hit, f"Actual ({actual_coords_example[0]:.2f},{actual_coords_example[1]:.2f})",
+                                             (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
 
-                             plt.title(f"Prediction Example: {os.path.basename(example_dir)}")
-                             plt.legend()
-                             plt.axis('off')
-                             plt.tight_layout()
                              plot_save_path = os.path.join(config.PROJECT_OUTPUT_PATH, f'prediction_example_{os.path.basename(example_dir)}.png')
-                             plt.savefig(plot_save_path)
+                             cv2.imwrite(plot_save_path, img_hit)
                              print(f"Saved prediction visualization to: {plot_save_path}")
-                             plt.show()
-                             plt.close() # Close the plot explicitly
                     except Exception as e: print(f"Error visualizing prediction: {e}")
                 else:
                      print("Pipeline prediction failed for example.")
@@ -782,6 +829,7 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="ST311 Tennis Analysis Pipeline")
     parser.add_argument('--download_data', action='store_true', help='Attempt to download dataset from Kaggle.')
+    parser.add_argument('--preresize_frames', action='store_true', help='One-time pre-resize of all frames to model resolution on disk.')
     parser.add_argument('--run_grid_search', action='store_true', help='Run grid search for Arch/HP.')
     parser.add_argument('--run_bayesian_opt', action='store_true', help='Run Bayesian optimization for CNN1 h(x) weighting.')
     parser.add_argument('--run_final_training', action='store_true', help='Run standard final training using best/default parameters.')
@@ -7,6 +7,37 @@ import collections # For OrderedDict if needed, but Sequential is fine
 from config import (DEFAULT_CNN1_FILTERS, DEFAULT_CNN1_FC_SIZE, DEFAULT_CNN1_DROPOUT,
                     DEFAULT_CNN2_CONV_FILTERS, DEFAULT_CNN2_FC_SIZES, DEFAULT_CNN2_DROPOUT, # Added CNN2 defaults
                     IMG_HEIGHT, IMG_WIDTH)
+def prepare_model(model, compile_mode='max-autotune'):
+    """Applies throughput settings to a freshly constructed model.
+
+    Converts the weights to channels_last (cuDNN's fast NHWC conv path;
+    conv layers accept NCHW inputs against NHWC weights) and wraps the
+    model with torch.compile for Inductor kernel fusion where available.
+    Use the wrapped model for training; checkpoints should be saved from
+    the underlying module (see train_model).
+    """
+    model = model.to(memory_format=torch.channels_last)
+    if hasattr(torch, 'compile'):
+        try:
+            model = torch.compile(model, mode=compile_mode)
+        except Exception as e:
+            print(f"Warning: torch.compile failed ({e}). Using eager model.")
+    return model
+
+def fuse_conv_bn(model):
+    """Folds each Conv2d -> BatchNorm2d pair in conv_blocks into the conv.
+
+    Inference-only: BN's scale+shift becomes part of the conv weights/bias,
+    removing one memory-bound kernel per block. Call after eval(); the
+    fused model must not be trained further.
+    """
+    blocks = model.conv_blocks
+    for i in range(len(blocks) - 1):
+        if isinstance(blocks[i], nn.Conv2d) and isinstance(blocks[i + 1], nn.BatchNorm2d):
+            blocks[i] = torch.nn.utils.fusion.fuse_conv_bn_eval(blocks[i], blocks[i + 1])
+            blocks[i + 1] = nn.Identity()
+    return model
+
 # --- CNN1: Hit Frame Regressor ---
 
 class HitFrameRegressorParam(nn.Module):
@@ -69,7 +100,14 @@ class HitFrameRegressorFinal(nn.Module):
                 nn.Conv2d(current_channels, num_filters, kernel_size=3, padding=1, bias=False),
                 nn.BatchNorm2d(num_filters),
                 nn.ReLU(inplace=True),
-                nn.Conv2d(num_filters, num_filters, kernel_size=3, padding=1, bias=False),
+                # Depthwise 3x3 + pointwise 1x1 replace the second dense 3x3
+                # conv (MobileNet-style): same receptive field, ~1/9 + 1/C of
+                # the multiplies in the wide blocks
+                nn.Conv2d(num_filters, num_filters, kernel_size=3, padding=1,
+                          groups=num_filters, bias=False),
+                nn.BatchNorm2d(num_filters),
+                nn.ReLU(inplace=True),
+                nn.Conv2d(num_filters, num_filters, kernel_size=1, bias=False),
                 nn.BatchNorm2d(num_filters),
                 nn.ReLU(inplace=True),
                 nn.MaxPool2d(kernel_size=2, stride=2)
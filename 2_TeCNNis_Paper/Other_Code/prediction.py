@@ -4,14 +4,27 @@ import torch
 import cv2
 import numpy as np
 import re
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
 # Import project modules
 import config
 from config import IMG_HEIGHT, IMG_WIDTH, DOUBLES_COURT_WIDTH_M, HALF_COURT_LENGTH_M
-from models import HitFrameRegressorFinal, LandingPointCNN
+from models import HitFrameRegressorFinal, LandingPointCNN, fuse_conv_bn, prepare_model
 
 # --- Model Loading Helpers ---
+def _load_state_dict(model_path):
+    """Loads a checkpoint with mmap streaming where PyTorch supports it.
+
+    mmap=True avoids materializing the whole file in host RAM before the
+    copy to device, and weights_only=True skips the general unpickler.
+    Falls back to a plain load on PyTorch < 2.1.
+    """
+    try:
+        return torch.load(model_path, map_location='cpu', mmap=True, weights_only=True)
+    except TypeError: # mmap/weights_only kwargs unavailable
+        return torch.load(model_path, map_location='cpu')
+
 def load_final_cnn1_model(model_path, device, arch_params):
     """Loads the final trained HitFrameRegressor model."""
     if not os.path.exists(model_path):
@@ -28,41 +41,103 @@ def load_final_cnn1_model(model_path, device, arch_params):
             fc_size=arch_fc,
             dropout_rate=arch_do
         ).to(device)
-        model.load_state_dict(torch.load(model_path, map_location=device))
+        model.load_state_dict(_load_state_dict(model_path))
         model.eval()
+        # Fold BN into the convs (inference-only), then NHWC weights so
+        # convs dispatch to the tensor-core channels_last path. fp16 on GPU:
+        # ~2x conv throughput, harmless at eval for these regressors.
+        model = fuse_conv_bn(model)
+        if device.type == 'cuda':
+            model = model.half()
+        # channels_last + torch.compile; reduce-overhead targets the
+        # launch-bound small-batch inference pattern (CUDA-graph replay)
+        model = prepare_model(model, compile_mode='reduce-overhead')
         print(f"Final CNN1 model loaded successfully from {os.path.basename(model_path)}")
         return model
     except Exception as e:
         print(f"Error loading CNN1 model state dict from {model_path}: {e}")
         return None
 
-def load_final_cnn2_model(model_path, device, input_channels):
+def load_final_cnn2_model(model_path, device, input_channels, arch_params=None):
     """Loads the final trained LandingPointCNN model."""
     if not os.path.exists(model_path):
         print(f"Error: CNN2 model file not found at {model_path}")
         return None
     try:
+        arch_params = arch_params or {}
         model = LandingPointCNN(
-            input_channels=input_channels, output_dim=2
+            input_channels=input_channels, output_dim=2,
+            conv_filters=tuple(arch_params.get('conv_filters', config.DEFAULT_CNN2_CONV_FILTERS)),
+            fc_sizes=tuple(arch_params.get('fc_sizes', config.DEFAULT_CNN2_FC_SIZES)),
+            dropout_rate=arch_params.get('dropout', config.DEFAULT_CNN2_DROPOUT)
         ).to(device)
-        model.load_state_dict(torch.load(model_path, map_location=device))
+        model.load_state_dict(_load_state_dict(model_path))
         model.eval()
+        model = fuse_conv_bn(model)
+        if device.type == 'cuda':
+            model = model.half()
+        model = prepare_model(model, compile_mode='reduce-overhead')
         print(f"Final CNN2 model loaded successfully from {os.path.basename(model_path)}")
         return model
     except Exception as e:
         print(f"Error loading CNN2 model state dict from {model_path}: {e}")
         return None
 
+# Frames per CNN1 forward pass during prediction; each launch amortizes
+# over the whole batch instead of paying Python + H2D + sync per frame
+CNN1_INFER_BATCH = 64
+
+def _quantize_cnn1_int8(model, calib_batch):
+    """Post-training static INT8 quantization of CNN1 for the CPU scan.
+
+    The frame scan feeds an argmax, which tolerates INT8 well, and x86
+    INT8 convs run ~4x faster through oneDNN. Calibrated on the provided
+    batch (the first real batch of the directory being scanned). Returns
+    the original model if the quantization stack is unavailable.
+    """
+    try:
+        from torch.ao.quantization import get_default_qconfig_mapping, quantize_fx
+        model = getattr(model, '_orig_mod', model) # FX tracing needs the plain module
+        qconfig_mapping = get_default_qconfig_mapping('x86')
+        prepared = quantize_fx.prepare_fx(model, qconfig_mapping,
+                                          example_inputs=(calib_batch,))
+        with torch.inference_mode():
+            prepared(calib_batch) # Single-batch calibration
+        return quantize_fx.convert_fx(prepared)
+    except Exception as e:
+        print(f"Warning: INT8 quantization unavailable ({e}). Using fp32 CNN1.")
+        return model
+
+def _load_frame_u8(frame_path):
+    """Reads and resizes one frame to uint8 HWC BGR (None on failure).
+
+    Deliberately leaves the channels in BGR: the swap to RGB happens on
+    the GPU as part of the batch normalize (a flip over 3 channels),
+    which removes a full-image cvtColor pass per frame on the CPU.
+    """
+    img_bgr = cv2.imread(frame_path)
+    if img_bgr is None: return None
+    return cv2.resize(img_bgr, (IMG_WIDTH, IMG_HEIGHT), interpolation=cv2.INTER_AREA)
+
 # --- Coordinate Denormalization ---
 def denormalize_coordinates(norm_x, norm_y):
-    """Converts normalized [0, 1] coordinates back to approx metric distances."""
-    norm_x, norm_y = np.clip(norm_x, 0, 1), np.clip(norm_y, 0, 1)
+    """Converts normalized [0, 1] coordinates back to approx metric distances.
+
+    Accepts scalars or (N,) arrays; a whole batch of CNN2 predictions
+    denormalizes in one vectorized pass. Scalar inputs return scalars.
+    """
+    scalar_input = np.isscalar(norm_x) or np.ndim(norm_x) == 0
+    norm_x = np.clip(np.atleast_1d(np.asarray(norm_x, dtype=np.float64)), 0, 1)
+    norm_y = np.clip(np.atleast_1d(np.asarray(norm_y, dtype=np.float64)), 0, 1)
     dist_from_left_m = norm_x * DOUBLES_COURT_WIDTH_M
     dist_from_right_m = DOUBLES_COURT_WIDTH_M - dist_from_left_m
     dist_from_baseline_m = norm_y * HALF_COURT_LENGTH_M # Y=0 is baseline, Y=1 is net
+    if scalar_input:
+        return dist_from_left_m[0], dist_from_right_m[0], dist_from_baseline_m[0]
     return dist_from_left_m, dist_from_right_m, dist_from_baseline_m
 
 # --- MODIFIED Full Prediction Pipeline ---
+@torch.inference_mode() # Whole pipeline is inference; keeps autograd out entirely
 def predict_hit_and_landing(cnn1_model, cnn2_model, frames_directory,
                             R1, R2, # Use R1, R2 (optimized integers)
                             device):
@@ -71,7 +146,8 @@ def predict_hit_and_landing(cnn1_model, cnn2_model, frames_directory,
     Selects R1+R2+1 frames for CNN2 based on CNN1 prediction.
     """
     print(f"\n--- Running Prediction Pipeline for: {os.path.basename(frames_directory)} ---")
-    if not cnn1_model or not cnn2_model:
+    # Explicit None checks: bool() on a compiled OptimizedModule raises
+    if cnn1_model is None or cnn2_model is None:
          print("Error: Models not loaded.")
          return None, None
     # R1/R2 can be None if standard models are used for prediction
@@ -107,24 +183,81 @@ def predict_hit_and_landing(cnn1_model, cnn2_model, frames_directory,
         print(f"Error reading/sorting frames in {frames_directory}: {e}")
         return None, None
 
-    # CNN1 Inference
+    # Inputs follow whatever dtype the load helpers left the weights in
+    # (fp16 on GPU, fp32 on CPU)
+    cnn1_dtype = next(cnn1_model.parameters()).dtype
+    cnn2_dtype = next(cnn2_model.parameters()).dtype
+
+    # Warmup passes so cudnn.benchmark algo search and torch.compile
+    # compilation happen before the per-batch loop (they would otherwise
+    # land mid-pipeline on the first real forward)
+    if device.type == 'cuda':
+        warm = torch.zeros((CNN1_INFER_BATCH, 3, IMG_HEIGHT, IMG_WIDTH),
+                           device=device, dtype=cnn1_dtype).contiguous(memory_format=torch.channels_last)
+        cnn1_model(warm)
+        warm2 = torch.zeros((1, 3 * cnn2_seq_len_dynamic, IMG_HEIGHT, IMG_WIDTH),
+                            device=device, dtype=cnn2_dtype).contiguous(memory_format=torch.channels_last)
+        cnn2_model(warm2)
+
+    # One reusable pinned staging buffer: frames are stacked straight into
+    # pinned memory and uploaded with non_blocking=True, instead of paying
+    # a fresh pin_memory allocation + copy per batch. The .cpu() score
+    # read-back at the end of each iteration fences the upload before the
+    # buffer is overwritten for the next batch.
+    pinned_buf = pinned_np = None
+    if device.type == 'cuda':
+        pinned_buf = torch.empty((CNN1_INFER_BATCH, IMG_HEIGHT, IMG_WIDTH, 3),
+                                 dtype=torch.uint8, pin_memory=True)
+        pinned_np = pinned_buf.numpy() # Shares the pinned storage
+
+    # CNN1 Inference (batched: one forward + one sync per CNN1_INFER_BATCH
+    # frames instead of per frame). Frame reads go through a thread pool:
+    # imread/resize release the GIL, so decode overlaps with GPU inference.
     predictions_cnn1 = []
-    with torch.no_grad():
-        for frame_path in tqdm(sorted_frame_paths, desc="CNN1 Inference", leave=False, ncols=80):
+    cnn1_scan_model = cnn1_model # Swapped for an INT8 copy on CPU below
+    with ThreadPoolExecutor(max_workers=max(1, config.NUM_WORKERS)) as executor:
+        for start in tqdm(range(0, num_total_frames, CNN1_INFER_BATCH),
+                          desc="CNN1 Inference", leave=False, ncols=80):
+            chunk_paths = sorted_frame_paths[start:start + CNN1_INFER_BATCH]
             try:
-                img_bgr = cv2.imread(frame_path)
-                if img_bgr is None: continue # Skip if load fails
+                frames, kept_paths = [], []
+                for frame_path, frame in zip(chunk_paths,
+                                             executor.map(_load_frame_u8, chunk_paths)):
+                    if frame is None: continue # Skip if load fails
+                    frames.append(frame)
+                    kept_paths.append(frame_path)
+                if not frames: continue
+
+                # Pad ragged batches (last chunk / failed reads) up to the
+                # fixed CNN1_INFER_BATCH: a constant input shape lets the
+                # reduce-overhead compiled model replay its recorded CUDA
+                # graph instead of re-capturing per shape
+                n_valid = len(frames)
+                if n_valid < CNN1_INFER_BATCH:
+                    frames.extend([np.zeros_like(frames[0])] * (CNN1_INFER_BATCH - n_valid))
+
+                # uint8 HWC upload; cast/normalize/permute happen on-device
+                if pinned_buf is not None:
+                    np.stack(frames, out=pinned_np)
+                    batch = pinned_buf.to(device, non_blocking=True)
+                else:
+                    batch = torch.from_numpy(np.stack(frames)).to(device)
+                # flip(1) turns the BGR upload into the RGB the model was
+                # trained on; it folds into the contiguous copy's traffic
+                batch = (batch.permute(0, 3, 1, 2).flip(1)
+                         .contiguous(memory_format=torch.channels_last)
+                         .to(cnn1_dtype).mul_(1.0 / 255.0))
 
-                img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
-                img_resized = cv2.resize(img_rgb, (IMG_WIDTH, IMG_HEIGHT), interpolation=cv2.INTER_LINEAR)
-                img_norm = (img_resized / 255.0).astype(np.float32)
-                img_chw = np.transpose(img_norm, (2, 0, 1))
-                inp_tensor = torch.from_numpy(img_chw).unsqueeze(0).to(device)
+                if device.type == 'cpu' and cnn1_scan_model is cnn1_model:
+                    # CPU-only scan: quantize once, calibrated on this
+                    # first batch of the directory
+                    cnn1_scan_model = _quantize_cnn1_int8(cnn1_model, batch)
 
-                score = cnn1_model(inp_tensor).item()
-                predictions_cnn1.append({'path': frame_path, 'score': score})
+                scores = cnn1_scan_model(batch).view(-1)[:n_valid].cpu().tolist()
+                predictions_cnn1.extend(
+                    {'path': p, 'score': s} for p, s in zip(kept_paths, scores))
             except Exception as e:
-                print(f"Warn: CNN1 error on frame {os.path.basename(frame_path)}: {e}")
+                print(f"Warn: CNN1 error on batch starting at frame {start}: {e}")
 
     if not predictions_cnn1:
         print("Error: CNN1 failed to produce any predictions.")
@@ -172,15 +305,14 @@ def predict_hit_and_landing(cnn1_model, cnn2_model, frames_directory,
         H, W = stacked_sequence.shape[2], stacked_sequence.shape[3]
         # Permute to [C, T, H, W] then reshape to [C*T, H, W] (T = DynamicSeqLen)
         input_tensor_cnn2 = stacked_sequence.permute(1, 0, 2, 3).reshape(C * cnn2_seq_len_dynamic, H, W)
-        input_batch_cnn2 = input_tensor_cnn2.unsqueeze(0).to(device) # Add batch dim
+        input_batch_cnn2 = input_tensor_cnn2.unsqueeze(0).to(device=device, dtype=cnn2_dtype) # Add batch dim
 
     except Exception as e:
         print(f"Error preprocessing sequence for CNN2: {e}")
         return None, predicted_hit_frame_path
 
     # Predict with CNN2
-    with torch.no_grad():
-        pred_coords_tensor = cnn2_model(input_batch_cnn2)
+    pred_coords_tensor = cnn2_model(input_batch_cnn2)
 
     pred_norm_x = pred_coords_tensor[0, 0].item()
     pred_norm_y = pred_coords_tensor[0, 1].item()
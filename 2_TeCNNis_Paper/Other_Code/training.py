@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import torch.optim as optim
 from torch.utils.data import DataLoader
 import time
@@ -9,6 +10,26 @@ import pandas as pd
 from tqdm import tqdm # Use standard tqdm
 import math
 import config
+from datasets import batch_to_model_input
+
+def make_adam(params, lr):
+    """Builds an Adam optimizer, preferring the fused CUDA kernel.
+
+    fused=True updates every parameter in one kernel launch instead of a
+    per-parameter Python loop; falls back to foreach=True (multi-tensor)
+    and then plain Adam on builds/devices that lack the fused path.
+    """
+    params = list(params) # .parameters() is a generator; keep it reusable for fallbacks
+    if torch.cuda.is_available():
+        try:
+            return optim.Adam(params, lr=lr, fused=True)
+        except (TypeError, RuntimeError):
+            pass # fused kwarg (PyTorch<2.0) or fused impl unavailable
+    try:
+        return optim.Adam(params, lr=lr, foreach=True)
+    except (TypeError, RuntimeError):
+        return optim.Adam(params, lr=lr)
+
 
 def train_model(model, model_name, train_loader, val_loader, criterion, optimizer, device, epochs,
                 early_stopping_patience=10, min_improvement=1e-5,
@@ -16,6 +37,9 @@ def train_model(model, model_name, train_loader, val_loader, criterion, optimize
     """Trains/validates model, supports early stopping, saves best model/history."""
     start_time = time.time()
     history = {'train_loss': [], 'val_loss': [], 'val_mae': []}
+    # Checkpoint the underlying module so weights saved from a
+    # torch.compile-wrapped model load into plain model instances
+    unwrapped_model = getattr(model, '_orig_mod', model)
     best_val_loss = float('inf')
     epochs_no_improve = 0
     best_epoch = 0
@@ -24,6 +48,18 @@ def train_model(model, model_name, train_loader, val_loader, criterion, optimize
     if best_model_save_path: os.makedirs(os.path.dirname(best_model_save_path), exist_ok=True)
     if results_save_path: os.makedirs(os.path.dirname(results_save_path), exist_ok=True)
 
+    # Mixed precision setup: prefer bf16 (no loss scaling needed), fall
+    # back to fp16 + GradScaler on older GPUs. All filter counts are
+    # multiples of 8, so tensor cores engage.
+    use_amp = device.type == 'cuda'
+    amp_dtype = torch.bfloat16 if (use_amp and torch.cuda.is_bf16_supported()) else torch.float16
+    scaler = torch.cuda.amp.GradScaler(enabled=use_amp and amp_dtype == torch.float16)
+
+    # Loop invariants hoisted out of the hot path: CNN1 targets are [B, 1],
+    # CNN2 targets are [B, 2]. non_blocking pairs with pin_memory loaders.
+    target_shape = (-1, 1) if model_name.startswith("CNN1") else (-1, 2)
+    non_blocking = device.type == 'cuda'
+
     log_level = "INFO" if not is_tuning_run else "WARNING" # Reduce verbosity for tuning
     print(f"--- Starting Training ({model_name}) for {epochs} epochs ---", flush=True)
     if early_stopping_patience > 0:
@@ -34,70 +70,59 @@ def train_model(model, model_name, train_loader, val_loader, criterion, optimize
 
         # --- Training Phase ---
         model.train()
-        running_train_loss = 0.0
-        # Use non_blocking for potentially faster transfer if pin_memory=True
-        non_blocking = device.type == 'cuda'
+        # Accumulate on-device; a .item() per step forces a CUDA sync that
+        # serializes the pipeline, so the sum is read back once per epoch
+        running_train_loss = torch.zeros((), device=device)
         train_loop = tqdm(train_loader, desc=f"Epoch {epoch+1}/{epochs} [Train]", leave=False, ncols=80)
 
-        for inputs, targets in train_loop:
-            inputs = inputs.to(device, non_blocking=non_blocking)
-            targets = targets.to(device, non_blocking=non_blocking)
-
-            # Adjust target shape (ensure correct dimensions)
-            if model_name.startswith("CNN1"): # CNN1 expects [B, 1]
-                targets = targets.view(-1, 1).float() # Robust reshape
-            elif model_name.startswith("CNN2"): # CNN2 expects [B, 2]
-                targets = targets.view(-1, 2).float() # Robust reshape
+        for i, (inputs, targets) in enumerate(train_loop):
+            # uint8 HWC batches are normalized/transposed on the GPU
+            inputs = batch_to_model_input(inputs.to(device, non_blocking=non_blocking))
+            targets = targets.to(device, non_blocking=non_blocking).view(target_shape).float()
 
             optimizer.zero_grad(set_to_none=True) # Slightly more efficient zeroing
 
-            # Optional: Use Mixed Precision (requires torch >= 1.6)
-            # with torch.cuda.amp.autocast(enabled=(device.type == 'cuda')):
-            #     outputs = model(inputs)
-            #     loss = criterion(outputs, targets)
-            # scaler.scale(loss).backward()
-            # scaler.step(optimizer)
-            # scaler.update()
-
-            # Standard precision training
-            outputs = model(inputs)
-            loss = criterion(outputs, targets)
-            loss.backward()
-            optimizer.step()
+            # Mixed precision forward; scaler is a no-op for bf16/CPU
+            with torch.autocast(device_type=device.type, dtype=amp_dtype, enabled=use_amp):
+                outputs = model(inputs)
+                loss = criterion(outputs, targets)
+            scaler.scale(loss).backward()
+            scaler.step(optimizer)
+            scaler.update()
 
-            running_train_loss += loss.item()
-            if not is_tuning_run:
+            running_train_loss += loss.detach()
+            if not is_tuning_run and i % 20 == 0: # Downsampled: set_postfix syncs via .item()
                 train_loop.set_postfix(loss=f"{loss.item():.5f}")
 
-        epoch_train_loss = running_train_loss / len(train_loader) if len(train_loader) > 0 else 0.0
+        epoch_train_loss = (running_train_loss / len(train_loader)).item() if len(train_loader) > 0 else 0.0
         history['train_loss'].append(epoch_train_loss)
         if not is_tuning_run: train_loop.close()
 
         # --- Validation Phase ---
         model.eval()
-        running_val_loss = 0.0
-        running_val_mae = 0.0
+        running_val_loss = torch.zeros((), device=device)
+        running_val_mae = torch.zeros((), device=device)
         val_loop = tqdm(val_loader, desc=f"Epoch {epoch+1}/{epochs} [Val]", leave=False, ncols=80)
 
         with torch.no_grad():
-            for inputs, targets in val_loop:
-                inputs = inputs.to(device, non_blocking=non_blocking)
-                targets = targets.to(device, non_blocking=non_blocking)
-                if model_name.startswith("CNN1"): targets = targets.view(-1, 1).float()
-                elif model_name.startswith("CNN2"): targets = targets.view(-1, 2).float()
-
-                # with torch.cuda.amp.autocast(enabled=(device.type == 'cuda')):
-                outputs = model(inputs)
-                loss = criterion(outputs, targets)
-                running_val_loss += loss.item()
-
-                mae = torch.abs(outputs - targets).mean()
-                running_val_mae += mae.item()
-                if not is_tuning_run:
+            for i, (inputs, targets) in enumerate(val_loop):
+                inputs = batch_to_model_input(inputs.to(device, non_blocking=non_blocking))
+                targets = targets.to(device, non_blocking=non_blocking).view(target_shape).float()
+
+                with torch.autocast(device_type=device.type, dtype=amp_dtype, enabled=use_amp):
+                    outputs = model(inputs)
+                    loss = criterion(outputs, targets)
+                running_val_loss += loss.detach()
+
+                # Fused kernel; avoids the torch.abs intermediate and handles
+                # AMP dtype promotion internally
+                mae = F.l1_loss(outputs, targets)
+                running_val_mae += mae.detach()
+                if not is_tuning_run and i % 20 == 0:
                      val_loop.set_postfix(loss=f"{loss.item():.5f}", mae=f"{mae.item():.4f}")
 
-        epoch_val_loss = running_val_loss / len(val_loader) if len(val_loader) > 0 else float('inf')
-        epoch_val_mae = running_val_mae / len(val_loader) if len(val_loader) > 0 else float('inf')
+        epoch_val_loss = (running_val_loss / len(val_loader)).item() if len(val_loader) > 0 else float('inf')
+        epoch_val_mae = (running_val_mae / len(val_loader)).item() if len(val_loader) > 0 else float('inf')
         history['val_loss'].append(epoch_val_loss)
         history['val_mae'].append(epoch_val_mae)
         if not is_tuning_run: val_loop.close()
@@ -120,7 +145,7 @@ def train_model(model, model_name, train_loader, val_loader, criterion, optimize
             best_epoch = epoch + 1
             if best_model_save_path:
                 try:
-                    torch.save(model.state_dict(), best_model_save_path)
+                    torch.save(unwrapped_model.state_dict(), best_model_save_path)
                     # if not is_tuning_run: print(f"    -> Val loss improved. Best model saved.", flush=True)
                 except Exception as e: print(f"    -> Error saving best model: {e}", flush=True)
         elif early_stopping_patience > 0: # Only increment if ES is enabled
@@ -132,7 +157,7 @@ def train_model(model, model_name, train_loader, val_loader, criterion, optimize
             if best_model_save_path and os.path.exists(best_model_save_path):
                 try:
                     # Load the best weights back into the model before returning
-                    model.load_state_dict(torch.load(best_model_save_path, map_location=device))
+                    unwrapped_model.load_state_dict(torch.load(best_model_save_path, map_location=device))
                     print(f"Loaded best model weights from epoch {best_epoch}.", flush=True)
                 except Exception as e: print(f"Error loading best model weights: {e}", flush=True)
             break # Exit training loop
@@ -159,32 +184,32 @@ def evaluate_model(model, model_name, test_loader, criterion, device):
     """Evaluates the model on the test set."""
     print(f"\n--- Evaluating Model ({model_name}) on Test Set ---", flush=True)
     model.eval()
-    running_test_loss = 0.0
-    running_test_mae = 0.0
+    running_test_loss = torch.zeros((), device=device)
+    running_test_mae = torch.zeros((), device=device)
     non_blocking = device.type == 'cuda'
+    target_shape = (-1, 1) if model_name.startswith("CNN1") else (-1, 2)
 
     if not test_loader or len(test_loader) == 0:
         print("Test loader is empty. Cannot evaluate.")
         return {'test_loss': float('nan'), 'test_mae': float('nan')}
 
-    with torch.no_grad():
+    # inference_mode also skips tensor version tracking, strictly faster
+    # than no_grad for pure inference
+    with torch.inference_mode():
         for inputs, targets in tqdm(test_loader, desc=f"Testing ({model_name})", ncols=80):
-            inputs = inputs.to(device, non_blocking=non_blocking)
-            targets = targets.to(device, non_blocking=non_blocking)
-
-            if model_name.startswith("CNN1"): targets = targets.view(-1, 1).float()
-            elif model_name.startswith("CNN2"): targets = targets.view(-1, 2).float()
+            inputs = batch_to_model_input(inputs.to(device, non_blocking=non_blocking))
+            targets = targets.to(device, non_blocking=non_blocking).view(target_shape).float()
 
             # with torch.cuda.amp.autocast(enabled=(device.type == 'cuda')):
             outputs = model(inputs)
             loss = criterion(outputs, targets)
-            running_test_loss += loss.item()
+            running_test_loss += loss.detach()
 
-            mae = torch.abs(outputs - targets).mean()
-            running_test_mae += mae.item()
+            mae = F.l1_loss(outputs, targets)
+            running_test_mae += mae.detach()
 
-    test_loss = running_test_loss / len(test_loader)
-    test_mae = running_test_mae / len(test_loader)
+    test_loss = (running_test_loss / len(test_loader)).item()
+    test_mae = (running_test_mae / len(test_loader)).item()
 
     print(f"Test Results ({model_name}):")
     print(f"  Test Loss (MSE): {test_loss:.6f}")
@@ -219,6 +244,10 @@ def train_joint_model(cnn1_model, cnn2_model, model_name,
     epochs_no_improve = 0
     best_epoch = 0
 
+    # Checkpoint the underlying modules (see train_model)
+    unwrapped_cnn1 = getattr(cnn1_model, '_orig_mod', cnn1_model)
+    unwrapped_cnn2 = getattr(cnn2_model, '_orig_mod', cnn2_model)
+
     # Loss functions
     criterion_cnn1 = nn.MSELoss()
     criterion_cnn2 = nn.MSELoss()
@@ -274,10 +303,15 @@ def train_joint_model(cnn1_model, cnn2_model, model_name,
 
             batch_size = long_seq_tensors.size(0)
             long_seq_len = long_seq_tensors.size(1) # e.g., JOINT_DATASET_CONTEXT_FRAMES
-            C, H, W = long_seq_tensors.shape[2], long_seq_tensors.shape[3], long_seq_tensors.shape[4]
 
-            # Move data to device
+            # Move data to device; the uint8 [B, T, H, W, C] batch becomes
+            # normalized float [B, T, C, H, W] only after the (4x smaller)
+            # H2D transfer
             long_seq_tensors = long_seq_tensors.to(device, non_blocking=non_blocking)
+            if long_seq_tensors.dtype == torch.uint8:
+                long_seq_tensors = (long_seq_tensors.permute(0, 1, 4, 2, 3)
+                                    .float().mul_(1.0 / 255.0).contiguous())
+            C, H, W = long_seq_tensors.shape[2], long_seq_tensors.shape[3], long_seq_tensors.shape[4]
             target_weights = target_weights.to(device, non_blocking=non_blocking).view(batch_size, long_seq_len).float()
             target_coords = target_coords.to(device, non_blocking=non_blocking).view(-1, 2).float()
             targets_true_hit_idx = targets_true_hit_idx.to(device, non_blocking=non_blocking).float() # Need float for L1 loss calc
@@ -400,7 +434,8 @@ def train_joint_model(cnn1_model, cnn2_model, model_name,
                 try:
                     # val_loader yields data from BallLandingDataset with dynamic length
                     for inputs_cnn2_val, targets_coords_val in val_loop:
-                        inputs_cnn2_val = inputs_cnn2_val.to(device, non_blocking=non_blocking) # Shape [B, C*DynamicSeqLen, H, W]
+                        inputs_cnn2_val = batch_to_model_input(
+                            inputs_cnn2_val.to(device, non_blocking=non_blocking)) # Shape [B, C*DynamicSeqLen, H, W]
                         targets_coords_val = targets_coords_val.to(device, non_blocking=non_blocking).view(-1, 2).float()
 
                         # This should now match model's expected input channels
@@ -408,7 +443,7 @@ def train_joint_model(cnn1_model, cnn2_model, model_name,
 
                         loss_c2_val = criterion_cnn2(outputs_coords_val, targets_coords_val)
                         running_val_loss_c2 += loss_c2_val.item()
-                        mae_c2_val = torch.abs(outputs_coords_val - targets_coords_val).mean()
+                        mae_c2_val = F.l1_loss(outputs_coords_val, targets_coords_val)
                         running_val_mae_c2 += mae_c2_val.item()
                         val_loop.set_postfix(loss=f"{loss_c2_val.item():.5f}", mae=f"{mae_c2_val.item():.4f}")
 
@@ -451,10 +486,10 @@ def train_joint_model(cnn1_model, cnn2_model, model_name,
                 best_epoch = epoch + 1
                 # Save BOTH models when validation improves
                 if best_model_save_path_cnn1:
-                    try: torch.save(cnn1_model.state_dict(), best_model_save_path_cnn1)
+                    try: torch.save(unwrapped_cnn1.state_dict(), best_model_save_path_cnn1)
                     except Exception as e: print(f" Error saving best CNN1: {e}")
                 if best_model_save_path_cnn2:
-                    try: torch.save(cnn2_model.state_dict(), best_model_save_path_cnn2)
+                    try: torch.save(unwrapped_cnn2.state_dict(), best_model_save_path_cnn2)
                     except Exception as e: print(f" Error saving best CNN2: {e}")
             elif early_stopping_patience > 0:
                 epochs_no_improve += 1
@@ -463,10 +498,10 @@ def train_joint_model(cnn1_model, cnn2_model, model_name,
                 print(f"Early stopping triggered at epoch {epoch+1}. Best Val Loss (CNN2): {best_val_loss:.6f} at epoch {best_epoch}.", flush=True)
                 # Load best weights back
                 if best_model_save_path_cnn1 and os.path.exists(best_model_save_path_cnn1):
-                    try: cnn1_model.load_state_dict(torch.load(best_model_save_path_cnn1, map_location=device))
+                    try: unwrapped_cnn1.load_state_dict(torch.load(best_model_save_path_cnn1, map_location=device))
                     except Exception as e: print(f" Error loading best CNN1 wts: {e}")
                 if best_model_save_path_cnn2 and os.path.exists(best_model_save_path_cnn2):
-                    try: cnn2_model.load_state_dict(torch.load(best_model_save_path_cnn2, map_location=device))
+                    try: unwrapped_cnn2.load_state_dict(torch.load(best_model_save_path_cnn2, map_location=device))
                     except Exception as e: print(f" Error loading best CNN2 wts: {e}")
                 if os.path.exists(best_model_save_path_cnn1) or os.path.exists(best_model_save_path_cnn2):
                     print(f"Loaded best model weights from epoch {best_epoch}.", flush=True)
@@ -476,10 +511,10 @@ def train_joint_model(cnn1_model, cnn2_model, model_name,
         if not val_loader and (epoch + 1) == epochs:
              print("Saving models at the end of training (no validation).")
              if best_model_save_path_cnn1:
-                 try: torch.save(cnn1_model.state_dict(), best_model_save_path_cnn1)
+                 try: torch.save(unwrapped_cnn1.state_dict(), best_model_save_path_cnn1)
                  except Exception as e: print(f" Error saving final CNN1: {e}")
              if best_model_save_path_cnn2:
-                 try: torch.save(cnn2_model.state_dict(), best_model_save_path_cnn2)
+                 try: torch.save(unwrapped_cnn2.state_dict(), best_model_save_path_cnn2)
                  except Exception as e: print(f" Error saving final CNN2: {e}")
 
     # --- End of Training Loop ---
@@ -1,7 +1,6 @@
 import json
 import os
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
 
 def load_json_params(config_path, param_name="parameters"):
@@ -24,6 +23,9 @@ def load_json_params(config_path, param_name="parameters"):
 
 def plot_training_history(history_data, model_name, save_path=None):
     """Plots training and validation loss and validation MAE."""
+    # Lazy import: matplotlib startup (fonts, backend probe) is slow and
+    # only needed when a plot is actually drawn
+    import matplotlib.pyplot as plt
     if isinstance(history_data, str) and os.path.exists(history_data):
         try:
             history_df = pd.read_csv(history_data)